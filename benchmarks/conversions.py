@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+"""
+Micro-benchmarks for the value conversion hot paths of the model fields, form
+fields and serializer fields.
+
+Run all the benchmarks and print the results:
+
+    python benchmarks/conversions.py
+
+Compare against the stored baseline, exiting with status 1 on regressions:
+
+    python benchmarks/conversions.py --compare
+
+Store the results as the new baseline:
+
+    python benchmarks/conversions.py --save
+
+No database connection is needed.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from collections import deque
+from ipaddress import IPv4Address, IPv6Address, ip_interface, ip_network
+from itertools import repeat
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'testsettings')
+
+import django
+django.setup()
+
+import netaddr
+from django.contrib.postgres.fields import ArrayField
+from django.db import connection
+
+from netfields import forms
+from netfields.compat import is_psycopg3
+from netfields.fields import (
+    CidrAddressField,
+    InetAddressField,
+    MACAddress8Field,
+    MACAddressField,
+    NetArrayField,
+)
+
+try:
+    from netfields import rest_framework
+except ImportError:
+    rest_framework = None
+
+
+DEFAULT_SIZES = (10 ** 4, 10 ** 5, 10 ** 6)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Number of elements in each array for the array benchmarks
+ARRAY_LENGTH = 100
+
+
+def inet_strings(size):
+    return ['%s/24' % IPv4Address((10 << 24) + i) for i in range(size)]
+
+
+def address_strings(size):
+    return [str(IPv4Address((10 << 24) + i)) for i in range(size)]
+
+
+def inet6_strings(size):
+    return ['%s/64' % IPv6Address((0x20010db8 << 96) + i) for i in range(size)]
+
+
+def cidr_strings(size):
+    return ['%s/28' % IPv4Address(i << 4) for i in range(size)]
+
+
+def _colon_hex(value, digits):
+    text = '%0*x' % (digits, value)
+    return ':'.join(text[i:i + 2] for i in range(0, digits, 2))
+
+
+def mac_strings(size):
+    return [_colon_hex(i, 12) for i in range(size)]
+
+
+def mac8_strings(size):
+    return [_colon_hex(i, 16) for i in range(size)]
+
+
+def parsed(field, strings):
+    def make(size):
+        return [field.to_python(value) for value in strings(size)]
+    return make
+
+
+def arrays(make):
+    # The same number of values as the scalar benchmarks, in arrays
+    def make_arrays(size):
+        values = make(size)
+        return [values[i:i + ARRAY_LENGTH] for i in range(0, len(values), ARRAY_LENGTH)]
+    return make_arrays
+
+
+class Case(object):
+    """
+    A function applied to every item of a list of values. Extra arguments are
+    passed after the item
+    """
+    def __init__(self, name, function, make_values, args=()):
+        self.name = name
+        self.function = function
+        self.make_values = make_values
+        self.args = args
+
+    def run(self, size, repeats):
+        """Return the best time per value in nanoseconds"""
+        values = self.make_values(size)
+        args = [repeat(arg) for arg in self.args]
+        best = None
+        for i in range(repeats):
+            start = time.perf_counter()
+            deque(map(self.function, values, *args), 0)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return best / size * 1e9
+
+
+def field_cases():
+    fields = (
+        ('inet', lambda: InetAddressField(), inet_strings),
+        ('inet6', lambda: InetAddressField(), inet6_strings),
+        ('inet_noprefix', lambda: InetAddressField(store_prefix_length=False), inet_strings),
+        ('inet_compact', lambda: InetAddressField(value_class='compact'), inet_strings),
+        ('cidr', lambda: CidrAddressField(), cidr_strings),
+        ('cidr_compact', lambda: CidrAddressField(value_class='compact'), cidr_strings),
+        ('mac', lambda: MACAddressField(), mac_strings),
+        ('mac8', lambda: MACAddress8Field(), mac8_strings),
+    )
+    for name, make_field, strings in fields:
+        field = make_field()
+        # Serialise values as for a model column rather than an array element
+        field.is_array_base_field = False
+        typed = parsed(field, strings)
+        yield Case('%s.to_python' % name, field.to_python, strings)
+        yield Case('%s.from_db_value(str)' % name, field.from_db_value, strings, (None, connection))
+        yield Case('%s.from_db_value(typed)' % name, field.from_db_value, typed, (None, connection))
+        yield Case('%s.get_prep_value' % name, field.get_prep_value, typed)
+        yield Case('%s.get_db_prep_value' % name, field.get_db_prep_value, typed, (connection,))
+
+        for array_class in (ArrayField, NetArrayField):
+            array_field = array_class(make_field())
+            yield Case(
+                '%s.%s.from_db_value' % (name, array_class.__name__),
+                array_field.from_db_value,
+                arrays(strings),
+                (None, connection),
+            )
+            yield Case(
+                '%s.%s.get_db_prep_value' % (name, array_class.__name__),
+                array_field.get_db_prep_value,
+                arrays(typed),
+                (connection,),
+            )
+
+
+def form_cases():
+    for name, field, strings in (
+        ('InetAddressFormField', forms.InetAddressFormField(), inet_strings),
+        ('NoPrefixInetAddressFormField', forms.NoPrefixInetAddressFormField(), address_strings),
+        ('CidrAddressFormField', forms.CidrAddressFormField(), cidr_strings),
+        ('MACAddressFormField', forms.MACAddressFormField(), mac_strings),
+        ('MACAddress8FormField', forms.MACAddress8FormField(), mac8_strings),
+    ):
+        yield Case('forms.%s.clean' % name, field.clean, strings)
+
+
+def rest_framework_cases():
+    if rest_framework is None:
+        return
+    for name, field, strings, typed in (
+        ('InetAddressField', rest_framework.InetAddressField(), inet_strings, ip_interface),
+        ('CidrAddressField', rest_framework.CidrAddressField(), cidr_strings, ip_network),
+        ('MACAddressField', rest_framework.MACAddressField(), mac_strings, netaddr.EUI),
+        ('MACAddress8Field', rest_framework.MACAddress8Field(), mac8_strings, netaddr.EUI),
+    ):
+        yield Case('rest_framework.%s.to_internal_value' % name, field.to_internal_value, strings)
+        yield Case(
+            'rest_framework.%s.to_representation' % name,
+            field.to_representation,
+            lambda size, strings=strings, typed=typed: [typed(value) for value in strings(size)],
+        )
+
+
+def all_cases():
+    for cases in (field_cases, form_cases, rest_framework_cases):
+        for case in cases():
+            yield case
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'netaddr': netaddr.__version__,
+        'driver': 'psycopg' if is_psycopg3 else 'psycopg2',
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+        help='comma separated numbers of values to convert (default: %(default)s)',
+    )
+    parser.add_argument('--repeat', type=int, default=3, help='runs per size, the best is kept')
+    parser.add_argument('--filter', default='', help='only run benchmarks containing this text')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file')
+    parser.add_argument('--save', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='compare the results with the baseline')
+    parser.add_argument(
+        '--threshold', type=float, default=0.25,
+        help='relative slowdown reported as a regression (default: %(default)s)',
+    )
+    options = parser.parse_args(argv)
+
+    sizes = [int(size) for size in options.sizes.split(',')]
+    baseline = {}
+    if options.compare:
+        with open(options.baseline) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    regressions = []
+    for case in all_cases():
+        if options.filter not in case.name:
+            continue
+        results[case.name] = {}
+        for size in sizes:
+            elapsed = case.run(size, options.repeat)
+            results[case.name][str(size)] = round(elapsed, 1)
+            line = '%-60s %9d %10.1f ns' % (case.name, size, elapsed)
+            previous = baseline.get(case.name, {}).get(str(size))
+            if previous:
+                change = elapsed / previous - 1
+                line += '  %+7.1f%%' % (change * 100)
+                if change > options.threshold:
+                    line += '  REGRESSION'
+                    regressions.append((case.name, size))
+            print(line)
+            sys.stdout.flush()
+
+    if options.save:
+        with open(options.baseline, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if regressions:
+        print('%d regression(s) over %d%%' % (len(regressions), options.threshold * 100))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
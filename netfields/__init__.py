@@ -1,8 +1,9 @@
 from django import VERSION
 
-from netfields.managers import NetManager
+from netfields.managers import NetManager, NetQuerySet
 from netfields.fields import (InetAddressField, CidrAddressField,
-                              MACAddressField, MACAddress8Field)
+                              MACAddressField, MACAddress8Field, NetArrayField,
+                              AddressPoolField)
 
 # only keep it for django 3.1 and below
 if VERSION[0] < 3 or VERSION[0] == 3 and VERSION[1]  < 2:
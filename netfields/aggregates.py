@@ -0,0 +1,103 @@
+"""Aggregates over inet and cidr columns."""
+
+from django.db.models import Aggregate
+
+from .fields import CidrAddressField, NetArrayField
+
+
+class MinInet(Aggregate):
+    """Aggregate returning the lowest address or network, with the type of the field."""
+
+    function = 'MIN'
+    name = 'MinInet'
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super(MinInet, self).as_sql(compiler, connection, **extra_context)
+        # min() and max() are only defined for inet, so cast cidr values back
+        if isinstance(self.output_field, CidrAddressField):
+            sql = '(%s)::cidr' % sql
+        return sql, params
+
+
+class MaxInet(MinInet):
+    """Aggregate returning the highest address or network, with the type of the field."""
+
+    function = 'MAX'
+    name = 'MaxInet'
+
+
+class InetMergeAgg(Aggregate):
+    """Aggregate returning the smallest network which includes every value.
+
+    In the address order, every value lies between the lowest and the highest
+    one, so this is the merge of those two. Groups mixing IPv4 and IPv6 give
+    NULL.
+    """
+
+    function = 'MIN'
+    name = 'InetMergeAgg'
+    output_field = CidrAddressField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        extra_context.pop('function', None)
+        lower, lower_params = super(InetMergeAgg, self).as_sql(
+            compiler, connection, function='MIN', **extra_context)
+        upper, upper_params = super(InetMergeAgg, self).as_sql(
+            compiler, connection, function='MAX', **extra_context)
+        sql = 'CASE WHEN FAMILY(%s) = FAMILY(%s) THEN INET_MERGE(%s, %s) END' % (lower, upper, lower, upper)
+        params = tuple(lower_params) + tuple(upper_params)
+        return sql, params + params
+
+
+# Collapse the networks in an array to the fewest covering the same addresses.
+# Networks contained in another are dropped first: sorted in the inet order,
+# a network is contained in an earlier one exactly when its last address is
+# not above every earlier last address. The remaining networks are disjoint,
+# so each step replaces every pair of sibling networks by their parent, until
+# no pair is left
+COLLAPSE_SQL = '''(
+    WITH RECURSIVE collapse(nets, previous) AS (
+        SELECT ARRAY(
+            SELECT n FROM (
+                SELECT n, MAX(HOST(BROADCAST(n))::inet) OVER (
+                    ORDER BY n ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                ) AS covered
+                FROM (
+                    SELECT DISTINCT NETWORK(n) AS n FROM UNNEST(%(aggregate)s) AS n WHERE n IS NOT NULL
+                ) AS distinct_nets
+            ) AS sorted_nets
+            WHERE covered IS NULL OR HOST(BROADCAST(n))::inet > covered
+        ), NULL::integer
+        UNION ALL
+        SELECT ARRAY(
+            SELECT CASE WHEN COUNT(*) = 2 THEN parent ELSE MIN(n)::cidr END FROM (
+                SELECT n, CASE
+                    WHEN MASKLEN(n) = 0 THEN n
+                    ELSE NETWORK(SET_MASKLEN(n, MASKLEN(n) - 1))
+                END AS parent
+                FROM UNNEST(collapse.nets) AS n
+            ) AS siblings
+            GROUP BY parent
+        ), CARDINALITY(collapse.nets)
+        FROM collapse
+        WHERE collapse.previous IS NULL OR CARDINALITY(collapse.nets) < collapse.previous
+    )
+    SELECT ARRAY(SELECT n FROM UNNEST(nets) AS n ORDER BY n)
+    FROM collapse ORDER BY CARDINALITY(nets) LIMIT 1
+)'''
+
+
+class CollapseNetworks(Aggregate):
+    """Aggregate returning the fewest networks covering the same addresses as the values.
+
+    This is the SQL equivalent of ipaddress.collapse_addresses(). Values of
+    inet fields stand for their network.
+    """
+
+    function = 'ARRAY_AGG'
+    name = 'CollapseNetworks'
+    output_field = NetArrayField(CidrAddressField())
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super(CollapseNetworks, self).as_sql(compiler, connection, **extra_context)
+        return COLLAPSE_SQL % {'aggregate': sql}, params
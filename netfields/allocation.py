@@ -0,0 +1,58 @@
+import hashlib
+import struct
+from ipaddress import ip_network
+
+from django.db import connections, router, transaction
+from django.db.transaction import TransactionManagementError
+
+from netfields.fields import CidrAddressField
+from netfields.managers import NetQuerySet
+
+
+def _lock_key(model, field):
+    """Return a stable 64-bit advisory lock key for a field"""
+    name = '%s.%s' % (model._meta.db_table, model._meta.get_field(field).column)
+    return struct.unpack('>q', hashlib.sha256(name.encode('utf-8')).digest()[:8])[0]
+
+
+def allocate_next_address(prefix, model, field, defaults=None, using=None):
+    """
+    Create and return a row of model holding the lowest free host address of
+    prefix in field, with the other fields set from defaults.
+
+    Allocators for the same field take a transaction level advisory lock
+    keyed on its table and column, so they wait for each other instead of
+    racing for the same address, whatever prefixes they allocate from. The
+    lock is held until the surrounding transaction ends. The free address is
+    only looked for once the lock is held, which requires the READ COMMITTED
+    isolation level: TransactionManagementError is raised under another one.
+    Raises ValueError when prefix is full
+    """
+    prefix = ip_network(str(prefix), strict=False)
+    if using is None:
+        using = router.db_for_write(model)
+
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "SELECT current_setting('transaction_isolation'), pg_advisory_xact_lock(%s)",
+                [_lock_key(model, field)]
+            )
+            isolation = cursor.fetchone()[0]
+        if isolation != 'read committed':
+            # The snapshot of later isolation levels is taken before the lock
+            # wait, so rows allocated meanwhile would not be seen
+            raise TransactionManagementError(
+                'allocate_next_address() requires the read committed isolation level, not %s' % isolation)
+        address = NetQuerySet(model, using=using).first_free_address(prefix, field=field)
+        if address is None:
+            raise ValueError('%s has no free address' % prefix)
+
+        model_field = model._meta.get_field(field)
+        if isinstance(model_field, CidrAddressField):
+            value = '%s/%d' % (address, prefix.max_prefixlen)
+        else:
+            value = '%s/%d' % (address, prefix.prefixlen)
+        values = dict(defaults or {})
+        values[field] = model_field.to_python(value)
+        return model._default_manager.db_manager(using).create(**values)
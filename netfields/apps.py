@@ -1,23 +1,31 @@
 import django
 from django.apps import AppConfig
+from django.core import checks
 from django.db.models import Field
 
-from netfields.fields import CidrAddressField, InetAddressField
+from netfields.fields import CidrAddressField, InetAddressField, MACAddress8Field, MACAddressField
 from netfields.lookups import (
     EndsWith,
     Family,
+    FamilyExact,
     IEndsWith,
     IRegex,
     IStartsWith,
+    In,
     InvalidLookup,
     InvalidSearchLookup,
     MaxPrefixlen,
     MinPrefixlen,
     NetContained,
+    NetContainedAny,
     NetContainedOrEqual,
+    NetContainedOrEqualAny,
     NetContains,
+    NetContainsAny,
     NetContainsOrEquals,
+    NetContainsOrEqualsAny,
     NetOverlaps,
+    NetOverlapsAny,
     Prefixlen,
     Regex,
     StartsWith,
@@ -39,6 +47,7 @@ class NetfieldsConfig(AppConfig):
         CidrAddressField.register_lookup(InvalidSearchLookup)
         InetAddressField.register_lookup(InvalidSearchLookup)
 
+    CidrAddressField.register_lookup(In)
     CidrAddressField.register_lookup(EndsWith)
     CidrAddressField.register_lookup(IEndsWith)
     CidrAddressField.register_lookup(StartsWith)
@@ -50,12 +59,18 @@ class NetfieldsConfig(AppConfig):
     CidrAddressField.register_lookup(NetContainedOrEqual)
     CidrAddressField.register_lookup(NetContainsOrEquals)
     CidrAddressField.register_lookup(NetOverlaps)
+    CidrAddressField.register_lookup(NetContainedAny)
+    CidrAddressField.register_lookup(NetContainsAny)
+    CidrAddressField.register_lookup(NetContainedOrEqualAny)
+    CidrAddressField.register_lookup(NetContainsOrEqualsAny)
+    CidrAddressField.register_lookup(NetOverlapsAny)
     CidrAddressField.register_lookup(Family)
     CidrAddressField.register_lookup(MaxPrefixlen)
     CidrAddressField.register_lookup(MinPrefixlen)
     CidrAddressField.register_lookup(Prefixlen)
     CidrAddressField.register_lookup(HostMatches)
 
+    InetAddressField.register_lookup(In)
     InetAddressField.register_lookup(EndsWith)
     InetAddressField.register_lookup(IEndsWith)
     InetAddressField.register_lookup(StartsWith)
@@ -67,6 +82,21 @@ class NetfieldsConfig(AppConfig):
     InetAddressField.register_lookup(NetContainedOrEqual)
     InetAddressField.register_lookup(NetContainsOrEquals)
     InetAddressField.register_lookup(NetOverlaps)
+    InetAddressField.register_lookup(NetContainedAny)
+    InetAddressField.register_lookup(NetContainsAny)
+    InetAddressField.register_lookup(NetContainedOrEqualAny)
+    InetAddressField.register_lookup(NetContainsOrEqualsAny)
+    InetAddressField.register_lookup(NetOverlapsAny)
     InetAddressField.register_lookup(Family)
     InetAddressField.register_lookup(Prefixlen)
     InetAddressField.register_lookup(HostMatches)
+
+    Family.register_lookup(FamilyExact)
+
+    MACAddressField.register_lookup(In)
+    MACAddress8Field.register_lookup(In)
+
+    def ready(self):
+        if django.VERSION >= (2, 2):
+            from netfields.checks import check_indexes
+            checks.register(check_indexes, checks.Tags.models)
@@ -0,0 +1,87 @@
+from django.apps import apps
+from django.core import checks
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F
+
+from netfields.fields import CidrAddressField, InetAddressField
+from netfields.indexes import INET_OPCLASS
+
+try:
+    from django.contrib.postgres.indexes import OpClass
+except ImportError:  # Django < 4.1
+    OpClass = None
+
+
+# Exclusion constraint operators that an inet_ops index can serve
+NET_OPERATORS = frozenset(['<<', '<<=', '>>', '>>=', '&&'])
+
+
+def _expression_name(expression):
+    """Return the field name and operator class of an index expression"""
+    opclass = None
+    if OpClass is not None and isinstance(expression, OpClass):
+        opclass = expression.extra['name']
+        expression = expression.get_source_expressions()[0]
+    if isinstance(expression, F):
+        expression = expression.name
+    if isinstance(expression, str):
+        return expression.lstrip('-'), opclass
+    return None, None
+
+
+def _exclusion_expressions(constraint):
+    """Return the field name, operator and operator class of each expression"""
+    if not hasattr(constraint, 'index_type'):
+        return
+    expressions = constraint.expressions
+    # Operator classes were given separately before Django 4.1
+    opclasses = list(getattr(constraint, 'opclasses', None) or ())
+    opclasses += [None] * (len(expressions) - len(opclasses))
+    for (expression, operator), opclass in zip(expressions, opclasses):
+        name, expression_opclass = _expression_name(expression)
+        if name is not None:
+            yield name, operator, expression_opclass or opclass
+
+
+def check_model_indexes(model):
+    """
+    Warn about inet and cidr fields compared with the network operators in
+    the exclusion constraints of a model without the inet_ops operator
+    class. PostgreSQL has no default GiST operator class for these
+    operators, so such a constraint cannot be created, and a separate index
+    does not help: the operator class must be given on the expression
+    """
+    errors = []
+    for constraint in getattr(model._meta, 'constraints', None) or ():
+        for name, operator, opclass in _exclusion_expressions(constraint):
+            if operator not in NET_OPERATORS or opclass == INET_OPCLASS:
+                continue
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if not isinstance(field, (InetAddressField, CidrAddressField)):
+                continue
+            if OpClass is not None:
+                hint = "Use OpClass('%s', name='%s') as the expression." % (name, INET_OPCLASS)
+            else:
+                hint = "Give '%s' as the operator class of the expression in opclasses." % INET_OPCLASS
+            errors.append(checks.Warning(
+                "Field '%s' is compared with %s in exclusion constraint '%s' "
+                "without the %s operator class." % (name, operator, constraint.name, INET_OPCLASS),
+                hint=hint,
+                obj=model,
+                id='netfields.W001',
+            ))
+    return errors
+
+
+def check_indexes(app_configs=None, **kwargs):
+    if app_configs is None:
+        models = apps.get_models()
+    else:
+        models = (model for app_config in app_configs for model in app_config.get_models())
+    errors = []
+    for model in models:
+        errors.extend(check_model_indexes(model))
+    return errors
@@ -0,0 +1,188 @@
+from functools import total_ordering
+from ipaddress import (
+    IPv4Address,
+    IPv4Interface,
+    IPv4Network,
+    IPv6Address,
+    IPv6Interface,
+    IPv6Network,
+    _BaseAddress,
+    _BaseNetwork,
+    ip_interface,
+    ip_network,
+)
+
+
+_ADDRESS_CLASSES = {4: IPv4Address, 6: IPv6Address}
+_INTERFACE_CLASSES = {4: IPv4Interface, 6: IPv6Interface}
+_NETWORK_CLASSES = {4: IPv4Network, 6: IPv6Network}
+
+
+def _to_ipaddress(value):
+    if isinstance(value, _CompactValue):
+        return value.to_ipaddress()
+    return value
+
+
+@total_ordering
+class _CompactValue(object):
+    """
+    Base for the int backed values. Anything not implemented here is looked
+    up on the equivalent ipaddress object, which is built on demand
+    """
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        # Private and special names are never delegated, which also keeps
+        # copy and pickle from recursing before the slots are set
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.to_ipaddress(), name)
+
+    def __eq__(self, other):
+        if type(other) is type(self):
+            return self._key() == other._key()
+        return self.to_ipaddress() == other
+
+    def __lt__(self, other):
+        return self.to_ipaddress() < _to_ipaddress(other)
+
+    def __hash__(self):
+        return hash(self.to_ipaddress())
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, str(self))
+
+    def __add__(self, other):
+        return self.to_ipaddress() + other
+
+    def __sub__(self, other):
+        return self.to_ipaddress() - other
+
+    # Special methods and the private attributes read by the ipaddress
+    # module are looked up on the type, so __getattr__ never sees them
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def _max_prefixlen(self):
+        return _ADDRESS_CLASSES[self._version]._max_prefixlen
+
+    @property
+    def _ALL_ONES(self):
+        return _ADDRESS_CLASSES[self._version]._ALL_ONES
+
+
+class CompactAddress(_CompactValue):
+    """An IP address stored as an integer"""
+    __slots__ = ('_ip', '_version')
+
+    def __init__(self, ip, version):
+        self._ip = ip
+        self._version = version
+
+    def _key(self):
+        return (self._version, self._ip)
+
+    def __int__(self):
+        return self._ip
+
+    def __str__(self):
+        return _ADDRESS_CLASSES[self._version]._string_from_ip_int(self._ip)
+
+    def to_ipaddress(self):
+        return _ADDRESS_CLASSES[self._version](self._ip)
+
+
+class CompactInterface(_CompactValue):
+    """An IP address and prefix length pair stored as integers"""
+    __slots__ = ('_ip', '_prefixlen', '_version')
+
+    def __init__(self, ip, prefixlen, version):
+        self._ip = ip
+        self._prefixlen = prefixlen
+        self._version = version
+
+    def _key(self):
+        return (self._version, self._ip, self._prefixlen)
+
+    def __int__(self):
+        return self._ip
+
+    def __str__(self):
+        return '%s/%d' % (
+            _ADDRESS_CLASSES[self._version]._string_from_ip_int(self._ip),
+            self._prefixlen,
+        )
+
+    def to_ipaddress(self):
+        return _INTERFACE_CLASSES[self._version]((self._ip, self._prefixlen))
+
+
+class CompactNetwork(_CompactValue):
+    """A network stored as its network address and prefix length"""
+    __slots__ = ('_network', '_prefixlen', '_version')
+
+    def __init__(self, network, prefixlen, version):
+        self._network = network
+        self._prefixlen = prefixlen
+        self._version = version
+
+    def _key(self):
+        return (self._version, self._network, self._prefixlen)
+
+    def __str__(self):
+        return '%s/%d' % (
+            _ADDRESS_CLASSES[self._version]._string_from_ip_int(self._network),
+            self._prefixlen,
+        )
+
+    @property
+    def prefixlen(self):
+        return self._prefixlen
+
+    def __contains__(self, other):
+        return _to_ipaddress(other) in self.to_ipaddress()
+
+    def __iter__(self):
+        return iter(self.to_ipaddress())
+
+    def __getitem__(self, n):
+        return self.to_ipaddress()[n]
+
+    def to_ipaddress(self):
+        return _NETWORK_CLASSES[self._version]((self._network, self._prefixlen))
+
+
+def compact_address(value):
+    """
+    Return a CompactAddress for the given value. Prefix lengths are discarded,
+    as with ip_interface(value).ip
+    """
+    if type(value) is CompactAddress:
+        return value
+    if type(value) is CompactInterface:
+        return CompactAddress(value._ip, value._version)
+    if not isinstance(value, _BaseAddress):
+        value = ip_interface(value)
+    return CompactAddress(int(value), value.version)
+
+
+def compact_interface(value):
+    """Return a CompactInterface for the given value, like ip_interface()"""
+    if type(value) is CompactInterface:
+        return value
+    if not isinstance(value, (IPv4Interface, IPv6Interface)):
+        value = ip_interface(value)
+    return CompactInterface(int(value), value.network.prefixlen, value.version)
+
+
+def compact_network(value):
+    """Return a CompactNetwork for the given value, like ip_network()"""
+    if type(value) is CompactNetwork:
+        return value
+    if not isinstance(value, _BaseNetwork):
+        value = ip_network(value)
+    return CompactNetwork(int(value.network_address), value.prefixlen, value.version)
@@ -1,10 +1,31 @@
-from django.core.exceptions import ValidationError
-from django.db import models
-
-from ipaddress import ip_interface, ip_network
+from functools import lru_cache
+
+from django.contrib.postgres.fields import ArrayField
+from django.core import checks
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections, models, router
+
+from ipaddress import (
+    IPv4Address,
+    IPv4Interface,
+    IPv4Network,
+    IPv6Address,
+    IPv6Interface,
+    IPv6Network,
+    ip_interface,
+    ip_network,
+)
 from netaddr import EUI
 from netaddr.core import AddrFormatError
 
+from netfields.compact import (
+    CompactAddress,
+    CompactInterface,
+    CompactNetwork,
+    compact_address,
+    compact_interface,
+    compact_network,
+)
 from netfields.compat import DatabaseWrapper, is_psycopg3
 from netfields.forms import (
     InetAddressFormField,
@@ -13,7 +34,15 @@ from netfields.forms import (
     MACAddressFormField,
     MACAddress8FormField
 )
-from netfields.mac import mac_unix_common, mac_eui64
+from netfields.lazy import LazyValue, LazyValueDescriptor
+from netfields.mac import (
+    is_canonical_mac,
+    is_canonical_mac8,
+    mac8_from_canonical,
+    mac_eui64,
+    mac_from_canonical,
+    mac_unix_common,
+)
 
 if is_psycopg3:
     from netfields.psycopg3_types import Inet, Macaddr, Macaddr8
@@ -39,9 +68,128 @@ NET_OPERATORS['min_prefixlen'] = '%s'
 
 NET_TEXT_OPERATORS = ['ILIKE %s', '~* %s']
 
+# Accepted values for the value_class argument of InetAddressField and
+# CidrAddressField. None uses the ipaddress types
+VALUE_CLASSES = (None, 'compact')
+
+
+def _interface_address(value):
+    """Return the address part of a value, as ip_interface(value).ip"""
+    if type(value) in (IPv4Interface, IPv6Interface):
+        return value.ip
+    return ip_interface(value).ip
+
+
+class _NetFieldMixin(object):
+    # Whether values are serialised as elements of an ArrayField. Fields added
+    # to a model through contribute_to_class() are plain columns, while
+    # ArrayField base fields never are, so this is resolved once instead of
+    # looking the field up in the model options for every value
+    is_array_base_field = True
+
+    def __init__(self, *args, **kwargs):
+        self.parse_cache = kwargs.pop('parse_cache', None)
+        self.lazy = kwargs.pop('lazy', False)
+        super(_NetFieldMixin, self).__init__(*args, **kwargs)
+        if self.parse_cache:
+            self._cached_to_python = lru_cache(maxsize=self.parse_cache)(self.to_python)
+        else:
+            self._cached_to_python = None
+
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super(_NetFieldMixin, self).contribute_to_class(cls, name, *args, **kwargs)
+        self.is_array_base_field = False
+        descriptor = cls.__dict__.get(self.attname)
+        if self.lazy and descriptor is not None:
+            setattr(cls, self.attname, LazyValueDescriptor(descriptor, self.attname))
+
+    def parse_db_value(self, value):
+        """
+        Convert a value read from the database. With lazy set, string values
+        are wrapped in a LazyValue and parsed on first use
+        """
+        if self.lazy and isinstance(value, str):
+            return LazyValue(value, self._parse_db_value)
+        return self._parse_db_value(value)
+
+    def _parse_db_value(self, value):
+        # With parse_cache set, string values are looked up in a bounded LRU
+        # cache so repeated values are parsed once and returned as the same
+        # object
+        if self._cached_to_python is not None and type(value) is str:
+            return self._cached_to_python(value)
+        return self.to_python(value)
+
+    def parse_db_values(self, values):
+        """
+        Convert a list of values read from the database in one pass, parsing
+        each distinct value once. Nested lists are converted recursively
+        """
+        parse = self.parse_db_value
+        parsed = {}
+        result = []
+        append = result.append
+        for value in values:
+            if value is None:
+                append(None)
+            elif isinstance(value, list):
+                append(self.parse_db_values(value))
+            else:
+                item = parsed.get(value)
+                if item is None:
+                    item = parsed[value] = parse(value)
+                append(item)
+        return result
+
+    def get_prep_values(self, values):
+        """
+        Serialise a list of values to strings in one pass. Nested lists are
+        serialised recursively
+        """
+        prep = self.get_prep_value
+        return [
+            None if value is None else
+            self.get_prep_values(value) if isinstance(value, (list, tuple)) else
+            prep(value)
+            for value in values
+        ]
+
+    def pre_save(self, model_instance, add):
+        value = model_instance.__dict__.get(self.attname)
+        if type(value) is LazyValue:
+            # Read the attribute without parsing an untouched lazy value
+            return value
+        return super(_NetFieldMixin, self).pre_save(model_instance, add)
+
+    def get_db_prep_save(self, value, connection):
+        if type(value) is LazyValue:
+            # Write back the text read from the database without parsing it
+            return self.get_db_prep_value(value.raw, connection, prepared=True)
+        return super(_NetFieldMixin, self).get_db_prep_save(value, connection)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(_NetFieldMixin, self).deconstruct()
+        if self.parse_cache is not None:
+            kwargs['parse_cache'] = self.parse_cache
+        if self.lazy:
+            kwargs['lazy'] = True
+        return name, path, args, kwargs
+
+    def parse_cache_info(self):
+        """
+        Return the hits, misses, maxsize and currsize of the parse cache, or
+        None if parse_cache is not set
+        """
+        if self._cached_to_python is None:
+            return None
+        return self._cached_to_python.cache_info()
+
 
-class _NetAddressField(models.Field):
+class _NetAddressField(_NetFieldMixin, models.Field):
     empty_strings_allowed = False
+    # Types the driver adapters may already have produced. Values of these
+    # types are returned by to_python() as they are, without a text round trip
+    value_types = ()
 
     def __init__(self, *args, **kwargs):
         kwargs['max_length'] = self.max_length
@@ -51,13 +199,19 @@ class _NetAddressField(models.Field):
         if isinstance(value, list):
             # Aggregation detected, return a list of values. This is no longer
             # necessary in Django 2.1
-            return [self.to_python(v) for v in value]
-        return self.to_python(value)
+            return self.parse_db_values(value)
+        return self.parse_db_value(value)
 
     def to_python(self, value):
         if not value:
             return value
 
+        if type(value) in self.value_types:
+            return value
+
+        if type(value) is LazyValue:
+            return value.resolve()
+
         if isinstance(value, bytes):
             value = value.decode('ascii')
 
@@ -94,15 +248,12 @@ class _NetAddressField(models.Field):
         if value is None:
             return None
 
-        if self.model._meta.get_field(self.name).get_internal_type() == 'ArrayField':
-            is_array_field = True
-        else:
-            is_array_field = False
-
-        if prepared is False and is_array_field is False:
-            return self.get_prep_value(value)
+        if not prepared:
+            value = self.get_prep_value(value)
+            if value is None or not self.is_array_base_field:
+                return value
 
-        return Inet(self.get_prep_value(value))
+        return Inet(value)
 
     def get_db_prep_lookup(self, lookup_type, value, connection,
                            prepared=False):
@@ -133,31 +284,36 @@ class _NetAddressField(models.Field):
         name, path, args, kwargs = super(_NetAddressField, self).deconstruct()
         if self.max_length is not None:
             kwargs['max_length'] = self.max_length
+        if self.value_class is not None:
+            kwargs['value_class'] = self.value_class
         return name, path, args, kwargs
 
 
 class InetAddressField(_NetAddressField):
     description = "PostgreSQL INET field"
     max_length = 39
+    value_types = (IPv4Interface, IPv6Interface)
 
     def __init__(self, *args, **kwargs):
         self.store_prefix_length = kwargs.pop('store_prefix_length', True)
+        self.value_class = kwargs.pop('value_class', None)
+        if self.value_class not in VALUE_CLASSES:
+            raise ValueError("value_class must be one of %s" % ', '.join(map(repr, VALUE_CLASSES)))
         super(InetAddressField, self).__init__(*args, **kwargs)
+        if self.value_class == 'compact':
+            self.value_types = (CompactInterface,) if self.store_prefix_length else (CompactAddress,)
+        elif not self.store_prefix_length:
+            self.value_types = (IPv4Address, IPv6Address)
 
     def db_type(self, connection):
         return 'inet'
 
     def python_type(self):
-        return ip_interface
-
-    def to_python(self, value):
-        value = super(InetAddressField, self).to_python(value)
-        if value:
-            if self.store_prefix_length:
-                return value
-            else:
-                return value.ip
-        return value
+        if self.value_class == 'compact':
+            return compact_interface if self.store_prefix_length else compact_address
+        if self.store_prefix_length:
+            return ip_interface
+        return _interface_address
 
     def form_class(self):
         if self.store_prefix_length:
@@ -169,18 +325,29 @@ class CidrAddressField(_NetAddressField):
     description = "PostgreSQL CIDR field"
     max_length = 43
     python_type = ip_network
+    value_types = (IPv4Network, IPv6Network)
+
+    def __init__(self, *args, **kwargs):
+        self.value_class = kwargs.pop('value_class', None)
+        if self.value_class not in VALUE_CLASSES:
+            raise ValueError("value_class must be one of %s" % ', '.join(map(repr, VALUE_CLASSES)))
+        super(CidrAddressField, self).__init__(*args, **kwargs)
+        if self.value_class == 'compact':
+            self.value_types = (CompactNetwork,)
 
     def db_type(self, connection):
         return 'cidr'
 
     def python_type(self):
+        if self.value_class == 'compact':
+            return compact_network
         return ip_network
 
     def form_class(self):
         return CidrAddressFormField
 
 
-class MACAddressField(models.Field):
+class MACAddressField(_NetFieldMixin, models.Field):
     description = "PostgreSQL MACADDR field"
     max_length = 17
 
@@ -188,12 +355,22 @@ class MACAddressField(models.Field):
         return 'macaddr'
 
     def from_db_value(self, value, expression, connection, *args):
-        return self.to_python(value)
+        return self.parse_db_value(value)
 
     def to_python(self, value):
         if not value:
             return value
 
+        if isinstance(value, EUI) and value.version == 48 and value.dialect is mac_unix_common:
+            return value
+
+        if type(value) is LazyValue:
+            return value.resolve()
+
+        if isinstance(value, str) and is_canonical_mac(value):
+            # The format used by PostgreSQL, which needs no format detection
+            return mac_from_canonical(value)
+
         try:
             return EUI(value, version=48, dialect=mac_unix_common)
         except (AddrFormatError, IndexError, TypeError) as e:
@@ -209,15 +386,19 @@ class MACAddressField(models.Field):
         if value is None:
             return None
 
-        if self.model._meta.get_field(self.name).get_internal_type() == 'ArrayField':
-            is_array_field = True
-        else:
-            is_array_field = False
+        if prepared:
+            # Already serialised by get_prep_value()
+            return Macaddr(value)
 
-        if prepared is False and is_array_field is False:
-            return self.get_prep_value(value)
+        if is_psycopg3:
+            # EUI objects are adapted directly by the registered dumpers
+            return self.to_python(value) or None
+
+        value = self.get_prep_value(value)
+        if value is None or not self.is_array_base_field:
+            return value
 
-        return Macaddr(self.get_prep_value(value))
+        return Macaddr(value)
 
     def formfield(self, **kwargs):
         defaults = {'form_class': MACAddressFormField}
@@ -225,7 +406,7 @@ class MACAddressField(models.Field):
         return super(MACAddressField, self).formfield(**defaults)
 
 
-class MACAddress8Field(models.Field):
+class MACAddress8Field(_NetFieldMixin, models.Field):
     """A MAC Address field with 8 bytes"""
 
     description = "PostgreSQL MACADDR8 field"
@@ -235,12 +416,22 @@ class MACAddress8Field(models.Field):
         return "macaddr8"
 
     def from_db_value(self, value, expression, connection, *args):
-        return self.to_python(value)
+        return self.parse_db_value(value)
 
     def to_python(self, value):
         if not value:
             return value
 
+        if isinstance(value, EUI) and value.version == 64 and value.dialect is mac_eui64:
+            return value
+
+        if type(value) is LazyValue:
+            return value.resolve()
+
+        if isinstance(value, str) and is_canonical_mac8(value):
+            # The format used by PostgreSQL, which needs no format detection
+            return mac8_from_canonical(value)
+
         try:
             mac = EUI(value, dialect=mac_eui64)
             if mac.version == 64:
@@ -261,17 +452,180 @@ class MACAddress8Field(models.Field):
         if value is None:
             return None
 
-        if self.model._meta.get_field(self.name).get_internal_type() == 'ArrayField':
-            is_array_field = True
-        else:
-            is_array_field = False
+        if prepared:
+            # Already serialised by get_prep_value()
+            return Macaddr8(value)
 
-        if prepared is False and is_array_field is False:
-            return self.get_prep_value(value)
+        if is_psycopg3:
+            # EUI objects are adapted directly by the registered dumpers
+            return self.to_python(value) or None
 
-        return Macaddr8(self.get_prep_value(value))
+        value = self.get_prep_value(value)
+        if value is None or not self.is_array_base_field:
+            return value
+
+        return Macaddr8(value)
 
     def formfield(self, **kwargs):
         defaults = {'form_class': MACAddress8FormField}
         defaults.update(kwargs)
         return super(MACAddress8Field, self).formfield(**defaults)
+
+
+class NetArrayField(ArrayField):
+    """
+    An ArrayField of one of the net fields that converts whole arrays in one
+    pass. Values read from the database are parsed once per distinct element,
+    and values are saved as plain strings cast by the placeholder instead of
+    wrapping each element for the driver
+    """
+
+    def _from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self.base_field.parse_db_values(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if prepared or not isinstance(value, (list, tuple)):
+            # Lookups may not cast the parameter, so keep the typed elements
+            return super(NetArrayField, self).get_db_prep_value(value, connection, prepared)
+        return self.base_field.get_prep_values(value)
+
+    def get_placeholder(self, value, compiler, connection):
+        return '%s::{}'.format(self.db_type(connection))
+
+
+# The pool bitmap of a row, created with every address free when the row has
+# none yet
+POOL_BITMAP_SQL = (
+    "COALESCE(%(pool)s, REPEAT('0', "
+    "(2 ^ (CASE FAMILY(%(network)s) WHEN 4 THEN 32 ELSE 128 END - MASKLEN(%(network)s)))::integer"
+    ")::varbit)"
+)
+
+
+class AddressPoolField(models.Field):
+    """
+    The allocation state of the addresses of a CidrAddressField of the same
+    model, stored as a bit varying with one bit per address. NULL means no
+    address is allocated. The bitmap is changed by allocate() and free(),
+    which run in the database, so regular saves should leave the field out
+    with update_fields or defer() to not overwrite concurrent changes
+    """
+    description = "PostgreSQL BIT VARYING address pool"
+    empty_strings_allowed = False
+    # Bit positions are computed as integers, and allocate() scans the bitmap
+    # linearly, so pools are limited to the size of a /8
+    max_addresses = 2 ** 24
+
+    def __init__(self, *args, **kwargs):
+        self.network_field = kwargs.pop('network_field', 'network')
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('editable', False)
+        super(AddressPoolField, self).__init__(*args, **kwargs)
+
+    def db_type(self, connection):
+        return 'varbit'
+
+    def get_placeholder(self, value, compiler, connection):
+        return '%s::varbit'
+
+    def check(self, **kwargs):
+        errors = super(AddressPoolField, self).check(**kwargs)
+        try:
+            network_field = self.model._meta.get_field(self.network_field)
+        except FieldDoesNotExist:
+            network_field = None
+        if not isinstance(network_field, CidrAddressField):
+            errors.append(checks.Error(
+                "'network_field' must name a CidrAddressField of %s, not %r"
+                % (self.model.__name__, self.network_field),
+                obj=self,
+                id='netfields.E001',
+            ))
+        return errors
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(AddressPoolField, self).deconstruct()
+        kwargs['network_field'] = self.network_field
+        if kwargs.get('null') is True:
+            del kwargs['null']
+        if kwargs.get('editable') is False:
+            del kwargs['editable']
+        return name, path, args, kwargs
+
+    def _execute(self, instance, sql, params):
+        model = type(instance)
+        network = getattr(instance, model._meta.get_field(self.network_field).attname)
+        if network is not None:
+            network = ip_network(str(network), strict=False)
+            if network.num_addresses > self.max_addresses:
+                raise ValueError('%s is too large for an address pool, which holds at most %d addresses'
+                                 % (network, self.max_addresses))
+        connection = connections[instance._state.db or router.db_for_write(model)]
+        qn = connection.ops.quote_name
+        names = {
+            'table': qn(model._meta.db_table),
+            'pool': qn(self.column),
+            'network': qn(model._meta.get_field(self.network_field).column),
+            'pk': qn(model._meta.pk.column),
+        }
+        names['bitmap'] = POOL_BITMAP_SQL % {
+            'pool': 'locked.%(pool)s' % names,
+            'network': 'locked.%(network)s' % names,
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(sql % names, params)
+            return cursor.fetchall()
+
+    def _changed(self, instance):
+        # The bitmap read before is stale now. Deferring it reloads it on next
+        # access, and leaves it out of saves of the instance
+        instance.__dict__.pop(self.attname, None)
+
+    def allocate(self, instance):
+        """
+        Mark the lowest free address of the pool of a saved instance as
+        allocated and return it, or None if the pool is full. The row is
+        locked from finding the address to setting its bit, so concurrent
+        allocations from a pool get different addresses
+        """
+        rows = self._execute(instance, (
+            "UPDATE %(table)s SET %(pool)s = SET_BIT(free.bitmap, free.index, 1) FROM ("
+            "SELECT pk, bitmap, POSITION(B'0' IN bitmap) - 1 AS index FROM ("
+            "SELECT locked.%(pk)s AS pk, %(bitmap)s AS bitmap FROM %(table)s AS locked "
+            "WHERE locked.%(pk)s = %%s FOR UPDATE"
+            ") AS pool"
+            ") AS free "
+            "WHERE %(table)s.%(pk)s = free.pk AND free.index >= 0 "
+            "RETURNING HOST(%(table)s.%(network)s + free.index)"
+        ), [instance.pk])
+        self._changed(instance)
+        if not rows:
+            return None
+        return ip_interface(rows[0][0]).ip
+
+    def free(self, instance, address):
+        """
+        Mark an address of the pool of a saved instance as free. Returns
+        whether it was allocated
+        """
+        address = str(ip_interface(str(address)).ip)
+        # CASE keeps the subtraction away from addresses outside the network
+        rows = self._execute(instance, (
+            "UPDATE %(table)s SET %(pool)s = SET_BIT(%(pool)s, (%%s::inet - %(network)s)::integer, 0) "
+            "WHERE %(pk)s = %%s AND CASE WHEN %%s::inet <<= %(network)s "
+            "THEN GET_BIT(%(pool)s, (%%s::inet - %(network)s)::integer) = 1 ELSE FALSE END "
+            "RETURNING %(pk)s"
+        ), [address, instance.pk, address, address])
+        self._changed(instance)
+        return bool(rows)
+
+    def is_allocated(self, instance, address):
+        """Return whether an address of the pool of a saved instance is allocated"""
+        address = str(ip_interface(str(address)).ip)
+        rows = self._execute(instance, (
+            "SELECT GET_BIT(%(pool)s, (%%s::inet - %(network)s)::integer) = 1 FROM %(table)s "
+            "WHERE %(pk)s = %%s AND %%s::inet <<= %(network)s"
+        ), [address, instance.pk, address])
+        return bool(rows and rows[0][0])
@@ -1,9 +1,10 @@
-from ipaddress import ip_address, ip_interface, ip_network, _IPAddressBase, _BaseNetwork
+from ipaddress import ip_address, ip_interface, ip_network, _IPAddressBase
 from netaddr import EUI, AddrFormatError
 
 from django import forms
 from django.core.exceptions import ValidationError
 
+from netfields.compact import CompactAddress, CompactInterface
 from netfields.mac import mac_unix_common, mac_eui64
 
 
@@ -20,7 +21,7 @@ class InetAddressFormField(forms.Field):
         if not value:
             return None
 
-        if isinstance(value, _IPAddressBase):
+        if isinstance(value, (_IPAddressBase, CompactAddress, CompactInterface)):
             return value
 
         if isinstance(value, str):
@@ -45,7 +46,7 @@ class NoPrefixInetAddressFormField(forms.Field):
         if not value:
             return None
 
-        if isinstance(value, _IPAddressBase):
+        if isinstance(value, (_IPAddressBase, CompactAddress, CompactInterface)):
             return value
 
         if isinstance(value, str):
@@ -71,9 +72,6 @@ class CidrAddressFormField(forms.Field):
         if not value:
             return None
 
-        if isinstance(value, _BaseNetwork):
-            network = value
-
         if isinstance(value, str):
             value = value.strip()
 
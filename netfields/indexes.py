@@ -0,0 +1,96 @@
+import copy
+
+from django.contrib.postgres.indexes import GistIndex
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Index, Q
+
+from netfields.fields import CidrAddressField, InetAddressField
+from netfields.functions import Family, Masklen
+
+try:
+    from django.contrib.postgres.indexes import SpGistIndex
+except ImportError:  # Django < 3.1
+    SpGistIndex = None
+
+
+INET_OPCLASS = 'inet_ops'
+
+
+class InetIndexMixin(object):
+    """
+    Default the inet and cidr fields of the index to the inet_ops operator
+    class, which the network lookups need to use it, and the other fields to
+    their default operator class. family=4 or family=6 restricts the index to
+    rows whose first field has that IP version
+    """
+    def __init__(self, *expressions, **kwargs):
+        fields = kwargs.get('fields') or ()
+        # The types of the fields are only known once the model is, so
+        # inet_ops stands for every field until create_sql()
+        self.default_opclasses = bool(fields) and not kwargs.get('opclasses')
+        if self.default_opclasses:
+            kwargs['opclasses'] = [INET_OPCLASS] * len(fields)
+
+        family = kwargs.pop('family', None)
+        if family is not None:
+            if family not in (4, 6):
+                raise ValueError('family must be 4 or 6, not %r' % (family,))
+            if not fields:
+                raise ValueError('family can only be used with fields')
+            condition = Q(**{'%s__family' % fields[0].lstrip('-'): family})
+            if kwargs.get('condition') is not None:
+                condition &= kwargs['condition']
+            kwargs['condition'] = condition
+
+        super(InetIndexMixin, self).__init__(*expressions, **kwargs)
+
+    def field_opclasses(self, model):
+        """Return the operator classes of the fields of the index on model"""
+        if not self.default_opclasses:
+            return list(self.opclasses)
+        opclasses = []
+        for name in self.fields:
+            try:
+                field = model._meta.get_field(name.lstrip('-'))
+            except FieldDoesNotExist:
+                field = None
+            opclasses.append(INET_OPCLASS if isinstance(field, (InetAddressField, CidrAddressField)) else '')
+        return opclasses
+
+    def create_sql(self, model, schema_editor, *args, **kwargs):
+        index = self
+        if self.default_opclasses:
+            index = copy.copy(self)
+            index.opclasses = self.field_opclasses(model)
+        return super(InetIndexMixin, index).create_sql(model, schema_editor, *args, **kwargs)
+
+    def deconstruct(self):
+        path, args, kwargs = super(InetIndexMixin, self).deconstruct()
+        if self.default_opclasses:
+            kwargs.pop('opclasses', None)
+        return path, args, kwargs
+
+
+class InetGistIndex(InetIndexMixin, GistIndex):
+    """A GiST index using the inet_ops operator class"""
+
+
+if SpGistIndex is not None:
+    class InetSpGistIndex(InetIndexMixin, SpGistIndex):
+        """An SP-GiST index using the inet_ops operator class"""
+
+
+def prefixlen_index(field, **kwargs):
+    """
+    Return a B-tree index on masklen(field), as used by the prefixlen,
+    min_prefixlen and max_prefixlen lookups. Requires Django 3.2+
+    """
+    return Index(Masklen(F(field)), **kwargs)
+
+
+def family_index(field, **kwargs):
+    """
+    Return a B-tree index on family(field), as used by family lookups other
+    than exact. Requires Django 3.2+
+    """
+    return Index(Family(F(field)), **kwargs)
@@ -0,0 +1,151 @@
+import operator
+
+
+_UNPARSED = object()
+
+# Names Django probes for with hasattr() to detect expressions and model
+# instances. Parsed values never have them, so they are not delegated
+_NOT_DELEGATED = frozenset([
+    'as_sql',
+    'contribute_to_class',
+    'deconstruct',
+    'get_compiler',
+    'prepare_database_save',
+    'resolve_expression',
+])
+
+
+class LazyValue(object):
+    """
+    A value read from the database by a field with lazy=True. The text is
+    only parsed the first time the value is used; model attributes are
+    replaced with the parsed value when they are first read.
+
+    Attributes, comparisons, arithmetic, iteration, indexing and conversion
+    to str, int and bool are delegated to the parsed value, but isinstance()
+    checks see a LazyValue. Use resolve() where the parsed type is needed
+    """
+    __slots__ = ('raw', '_parse', '_value')
+
+    def __init__(self, raw, parse):
+        self.raw = raw
+        self._parse = parse
+        self._value = _UNPARSED
+
+    def resolve(self):
+        """Return the parsed value"""
+        value = self._value
+        if value is _UNPARSED:
+            value = self._value = self._parse(self.raw)
+        return value
+
+    def __getattr__(self, name):
+        # Private and special names are never delegated, which also keeps
+        # copy and pickle from recursing before the slots are set
+        if name.startswith('_') or name.startswith('as_') or name in _NOT_DELEGATED:
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __str__(self):
+        return str(self.resolve())
+
+    def __repr__(self):
+        return repr(self.resolve())
+
+    def __int__(self):
+        return int(self.resolve())
+
+    def __hash__(self):
+        return hash(self.resolve())
+
+    def __eq__(self, other):
+        if type(other) is LazyValue:
+            other = other.resolve()
+        return self.resolve() == other
+
+    def __lt__(self, other):
+        if type(other) is LazyValue:
+            other = other.resolve()
+        return self.resolve() < other
+
+    def __le__(self, other):
+        if type(other) is LazyValue:
+            other = other.resolve()
+        return self.resolve() <= other
+
+    def __gt__(self, other):
+        if type(other) is LazyValue:
+            other = other.resolve()
+        return self.resolve() > other
+
+    def __ge__(self, other):
+        if type(other) is LazyValue:
+            other = other.resolve()
+        return self.resolve() >= other
+
+    def __contains__(self, item):
+        return item in self.resolve()
+
+    def __iter__(self):
+        return iter(self.resolve())
+
+    def __getitem__(self, key):
+        return self.resolve()[key]
+
+    def __bool__(self):
+        return bool(self.resolve())
+
+    __nonzero__ = __bool__
+
+    def __index__(self):
+        return operator.index(self.resolve())
+
+    def __format__(self, format_spec):
+        return format(self.resolve(), format_spec)
+
+    def __add__(self, other):
+        if type(other) is LazyValue:
+            other = other.resolve()
+        return self.resolve() + other
+
+    def __radd__(self, other):
+        return other + self.resolve()
+
+    def __sub__(self, other):
+        if type(other) is LazyValue:
+            other = other.resolve()
+        return self.resolve() - other
+
+    def __rsub__(self, other):
+        return other - self.resolve()
+
+    def __reduce_ex__(self, protocol):
+        # Pickle and copy the parsed value itself
+        return self.resolve().__reduce_ex__(protocol)
+
+
+class LazyValueDescriptor(object):
+    """
+    Wrap the attribute descriptor Django installs for a field, replacing a
+    LazyValue in the instance with the parsed value when it is read. Unlike
+    Django's descriptor this is a data descriptor, so it is consulted even
+    when the instance already holds a value
+    """
+    def __init__(self, descriptor, attname):
+        self.descriptor = descriptor
+        self.attname = attname
+
+    def __get__(self, instance, cls=None):
+        value = self.descriptor.__get__(instance, cls)
+        if type(value) is LazyValue:
+            value = instance.__dict__[self.attname] = value.resolve()
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.attname] = value
+
+    def __delete__(self, instance):
+        try:
+            del instance.__dict__[self.attname]
+        except KeyError:
+            raise AttributeError(self.attname)
@@ -1,8 +1,12 @@
+import re
 import warnings
-from django.core.exceptions import FieldError
+from string import hexdigits as HEXDIGITS
+from django.core.exceptions import EmptyResultSet, FieldError
 from django.db.models import Lookup, Transform, IntegerField
-from django.db.models.lookups import EndsWith, IEndsWith, StartsWith, IStartsWith, Regex, IRegex
+from django.db.models.lookups import Exact
+from django.db.models.lookups import EndsWith, IEndsWith, StartsWith, IStartsWith, Regex, IRegex, In
 import ipaddress
+from netfields.compact import CompactAddress, CompactInterface, CompactNetwork
 from netfields.fields import InetAddressField, CidrAddressField
 
 
@@ -35,6 +39,85 @@ class NetFieldDecoratorMixin(object):
         return lhs_string, lhs_params
 
 
+# str.isdigit() also accepts non-ASCII digits, which int() then parses
+_OCTET = re.compile(r'[0-9]{1,3}\Z')
+
+
+def _prefix_network(prefix):
+    """
+    Return the smallest network on an octet or hextet boundary containing
+    every address whose text starts with prefix, or None if there is none
+    """
+    if '.' in prefix:
+        octets = prefix[:prefix.rfind('.')].split('.')
+        if not 1 <= len(octets) <= 3:
+            return None
+        if not all(_OCTET.match(octet) and int(octet) <= 255 for octet in octets):
+            return None
+        return '%s/%d' % ('.'.join(octets + ['0'] * (4 - len(octets))), len(octets) * 8)
+    if ':' in prefix:
+        # Zero hextets may be compressed away after a ::
+        if '::' in prefix:
+            prefix = prefix[:prefix.index('::') + 1]
+        hextets = prefix[:prefix.rfind(':')].split(':')
+        if not 1 <= len(hextets) <= 7:
+            return None
+        if not all(1 <= len(hextet) <= 4 and all(c in HEXDIGITS for c in hextet) for hextet in hextets):
+            return None
+        return '%s::/%d' % (':'.join(hextets), len(hextets) * 16)
+    return None
+
+
+def _regex_prefix(pattern):
+    """
+    Return the literal text every match of an anchored regular expression
+    starts with, as far as it can be told from the characters that may
+    appear in an address
+    """
+    if not pattern.startswith('^') or '|' in pattern:
+        return ''
+    prefix = []
+    i = 1
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\' and pattern[i + 1:i + 2] == '.':
+            prefix.append('.')
+            i += 2
+        elif c == ':' or c in HEXDIGITS:
+            prefix.append(c)
+            i += 1
+        else:
+            if c in '?*{' and prefix:
+                # The last character is optional or repeated
+                prefix.pop()
+            break
+    return ''.join(prefix)
+
+
+class NetPrefixRangeMixin(object):
+    """
+    For patterns that fix the start of the address text, such as '10.20.' or
+    '2001:db8:', add an overlap check against the network covering every
+    matching address. GiST inet_ops indexes can serve it, and the text
+    comparison still decides the final result. A plain <<= is not used since
+    it would miss inet values with a shorter mask than the network
+    """
+
+    def get_prefix(self):
+        return self.rhs
+
+    def as_sql(self, qn, connection):
+        sql, params = super(NetPrefixRangeMixin, self).as_sql(qn, connection)
+        field = self.lhs.source if hasattr(self.lhs, 'source') else self.lhs.output_field
+        if not isinstance(field, (InetAddressField, CidrAddressField)) or not isinstance(self.rhs, str):
+            return sql, params
+        network = _prefix_network(self.get_prefix())
+        if network is None:
+            return sql, params
+        lhs, lhs_params = qn.compile(self.lhs)
+        return '(%s && %%s AND %s)' % (lhs, sql), list(lhs_params) + [network] + list(params)
+
+
 class EndsWith(NetFieldDecoratorMixin, EndsWith):
     pass
 
@@ -43,38 +126,104 @@ class IEndsWith(NetFieldDecoratorMixin, IEndsWith):
     pass
 
 
-class StartsWith(NetFieldDecoratorMixin, StartsWith):
+class StartsWith(NetPrefixRangeMixin, NetFieldDecoratorMixin, StartsWith):
     pass
 
 
-class IStartsWith(NetFieldDecoratorMixin, IStartsWith):
+class IStartsWith(NetPrefixRangeMixin, NetFieldDecoratorMixin, IStartsWith):
     pass
 
 
-class Regex(NetFieldDecoratorMixin, Regex):
-    pass
+class Regex(NetPrefixRangeMixin, NetFieldDecoratorMixin, Regex):
+    def get_prefix(self):
+        return _regex_prefix(self.rhs)
 
 
-class IRegex(NetFieldDecoratorMixin, IRegex):
-    pass
+class IRegex(NetPrefixRangeMixin, NetFieldDecoratorMixin, IRegex):
+    def get_prefix(self):
+        return _regex_prefix(self.rhs)
+
+
+def _values(rhs):
+    """
+    Return the values of a lookup taking a list. A network stands for itself
+    rather than for the list of its addresses
+    """
+    if isinstance(rhs, (ipaddress._BaseNetwork, CompactNetwork)):
+        return [rhs]
+    return list(rhs)
+
+
+class In(In):
+    """
+    Send a list of values as a single typed array parameter,
+    "field = ANY(%s::inet[])", instead of a placeholder for each value.
+    Subqueries and lists containing expressions use the default SQL
+    """
+    def get_prep_lookup(self):
+        self.as_array = False
+        if hasattr(self.rhs, 'resolve_expression'):
+            return super(In, self).get_prep_lookup()
+        self.rhs = _values(self.rhs)
+        if any(hasattr(value, 'resolve_expression') for value in self.rhs):
+            return super(In, self).get_prep_lookup()
+        self.as_array = True
+        # NULL is never equal to anything
+        values = self.lhs.output_field.get_prep_values(self.rhs)
+        return [value for value in values if value is not None]
+
+    def as_sql(self, qn, connection):
+        if not self.as_array:
+            return super(In, self).as_sql(qn, connection)
+        if not self.rhs:
+            raise EmptyResultSet
+        lhs, lhs_params = self.process_lhs(qn, connection)
+        params = list(lhs_params) + [self.rhs]
+        return '%s = ANY(%%s::%s[])' % (lhs, self.lhs.output_field.db_type(connection)), params
 
 
 class NetworkLookup(object):
     def get_prep_lookup(self):
         if hasattr(self.rhs, 'resolve_expression'):
             return self.rhs
-        if isinstance(self.rhs, ipaddress._BaseNetwork):
-            return str(self.rhs)
-        return str(ipaddress.ip_network(self.rhs))
+        return self.prep_value(self.rhs)
+
+    def prep_value(self, value):
+        if isinstance(value, (ipaddress._BaseNetwork, CompactNetwork)):
+            return str(value)
+        return str(ipaddress.ip_network(value))
 
 
 class AddressLookup(object):
     def get_prep_lookup(self):
         if hasattr(self.rhs, 'resolve_expression'):
             return self.rhs
-        if isinstance(self.rhs, ipaddress._BaseAddress):
-            return str(self.rhs)
-        return str(ipaddress.ip_interface(self.rhs))
+        return self.prep_value(self.rhs)
+
+    def prep_value(self, value):
+        if isinstance(value, (ipaddress._BaseAddress, CompactAddress, CompactInterface)):
+            return str(value)
+        return str(ipaddress.ip_interface(value))
+
+
+class AnyLookupMixin(object):
+    """
+    Compare with each item of an iterable, which is passed as a single array
+    parameter
+    """
+    operator = None
+    array_type = None
+
+    def get_prep_lookup(self):
+        if hasattr(self.rhs, 'resolve_expression'):
+            return self.rhs
+        return [self.prep_value(value) for value in _values(self.rhs)]
+
+    def as_sql(self, qn, connection):
+        lhs, lhs_params = self.process_lhs(qn, connection)
+        rhs, rhs_params = self.process_rhs(qn, connection)
+        params = list(lhs_params) + list(rhs_params)
+        return '%s %s ANY(%s::%s[])' % (lhs, self.operator, rhs, self.array_type), params
 
 
 class NetContains(AddressLookup, Lookup):
@@ -127,14 +276,46 @@ class NetOverlaps(NetworkLookup, Lookup):
         return '%s && %s' % (lhs, rhs), params
 
 
+class NetContainsAny(AnyLookupMixin, AddressLookup, Lookup):
+    lookup_name = 'net_contains_any'
+    operator = '>>'
+    array_type = 'inet'
+
+
+class NetContainedAny(AnyLookupMixin, NetworkLookup, Lookup):
+    lookup_name = 'net_contained_any'
+    operator = '<<'
+    array_type = 'cidr'
+
+
+class NetContainsOrEqualsAny(AnyLookupMixin, AddressLookup, Lookup):
+    lookup_name = 'net_contains_or_equals_any'
+    operator = '>>='
+    array_type = 'inet'
+
+
+class NetContainedOrEqualAny(AnyLookupMixin, NetworkLookup, Lookup):
+    lookup_name = 'net_contained_or_equal_any'
+    operator = '<<='
+    array_type = 'cidr'
+
+
+class NetOverlapsAny(AnyLookupMixin, NetworkLookup, Lookup):
+    lookup_name = 'net_overlaps_any'
+    operator = '&&'
+    array_type = 'cidr'
+
+
 class HostMatches(AddressLookup, Lookup):
     lookup_name = 'host'
 
     def as_sql(self, qn, connection):
+        # Any value with the same host contains the host address, which an
+        # inet_ops index can check before the exact comparison
         lhs, lhs_params = self.process_lhs(qn, connection)
         rhs, rhs_params = self.process_rhs(qn, connection)
-        params = lhs_params + rhs_params
-        return 'HOST(%s) = HOST(%s)' % (lhs, rhs), params
+        params = list(lhs_params) + list(rhs_params)
+        return '(%s >>= HOST(%s)::inet AND HOST(%s) = HOST(%s))' % (lhs, rhs, lhs, rhs), params + params
 
 
 class Family(Transform):
@@ -149,6 +330,20 @@ class Family(Transform):
         return IntegerField()
 
 
+class FamilyExact(Exact):
+    """
+    Compare the family with 4 or 6 as containment in 0.0.0.0/0 or ::/0, which
+    an inet_ops index can serve
+    """
+    networks = {4: '0.0.0.0/0', 6: '::/0'}
+
+    def as_sql(self, qn, connection):
+        if not isinstance(self.rhs, int) or self.rhs not in self.networks:
+            return super(FamilyExact, self).as_sql(qn, connection)
+        lhs, lhs_params = qn.compile(self.lhs.lhs)
+        return '%s <<= %%s' % lhs, list(lhs_params) + [self.networks[self.rhs]]
+
+
 class _PrefixlenMixin(object):
     format_string = None
 
@@ -1,3 +1,5 @@
+import re
+
 import netaddr
 
 
@@ -27,3 +29,36 @@ class mac_eui64:
 
     #: The number base to be used when interpreting word values as integers.
     word_base = 16
+
+
+# Text formats of macaddr and macaddr8 values as output by PostgreSQL
+_CANONICAL_MAC = re.compile(r'[0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){5}')
+_CANONICAL_MAC8 = re.compile(r'[0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){7}')
+
+
+def mac_from_canonical(value):
+    """
+    Build an EUI-48 with the mac_unix_common dialect from text in the
+    xx:xx:xx:xx:xx:xx format without going through netaddr's format
+    detection. The format is not checked
+    """
+    return netaddr.EUI(int(value.replace(':', ''), 16), version=48, dialect=mac_unix_common)
+
+
+def mac8_from_canonical(value):
+    """
+    Build an EUI-64 with the mac_eui64 dialect from text in the
+    xx:xx:xx:xx:xx:xx:xx:xx format without going through netaddr's format
+    detection. The format is not checked
+    """
+    return netaddr.EUI(int(value.replace(':', ''), 16), version=64, dialect=mac_eui64)
+
+
+def is_canonical_mac(value):
+    """Return whether value is a string in the xx:xx:xx:xx:xx:xx format"""
+    return len(value) == 17 and _CANONICAL_MAC.fullmatch(value) is not None
+
+
+def is_canonical_mac8(value):
+    """Return whether value is a string in the xx:xx:xx:xx:xx:xx:xx:xx format"""
+    return len(value) == 23 and _CANONICAL_MAC8.fullmatch(value) is not None
@@ -1,5 +1,15 @@
-from django.db import models
-from ipaddress import _BaseNetwork
+import copy
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models, transaction
+from django.db.models import Q, sql
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.query import RawQuerySet
+from ipaddress import _BaseNetwork, ip_address, ip_interface, ip_network
+
+from netfields import prefix_index
+from netfields.compact import CompactNetwork
+from netfields.fields import CidrAddressField
 
 try:
     str_type = unicode
@@ -7,13 +17,371 @@ except NameError:
     str_type = str
 
 
-class NetManager(models.Manager):
-    use_for_related_fields = True
+_NETWORK_TYPES = (_BaseNetwork, CompactNetwork)
+
+
+def _normalise_value(key, value):
+    """
+    Replace networks in the value of a lookup by their string. Django would
+    otherwise consume a _BaseNetwork as an iterable, making a list of every
+    address in it. A network given to a lookup expecting a list, such as in,
+    stands for a list of that one network
+    """
+    if isinstance(value, _NETWORK_TYPES):
+        lookup = key.rsplit(LOOKUP_SEP, 1)[-1]
+        if lookup == 'in' or lookup.endswith('_any'):
+            return [str_type(value)]
+        return str_type(value)
+    if isinstance(value, (list, tuple)) and any(isinstance(item, _NETWORK_TYPES) for item in value):
+        items = [str_type(item) if isinstance(item, _NETWORK_TYPES) else item for item in value]
+        return items if isinstance(value, list) else tuple(items)
+    return value
+
+
+def _normalise_kwargs(kwargs):
+    return dict((key, _normalise_value(key, value)) for key, value in kwargs.items())
+
+
+def _normalise_q(q):
+    """Return a copy of a Q object with the networks in its lookups normalised"""
+    clone = copy.copy(q)
+    clone.children = [
+        _normalise_q(child) if isinstance(child, Q) else
+        (child[0], _normalise_value(child[0], child[1])) if isinstance(child, tuple) and len(child) == 2 else
+        child
+        for child in q.children
+    ]
+    return clone
+
+
+def _normalise_args(args):
+    return tuple(_normalise_q(arg) if isinstance(arg, Q) else arg for arg in args)
+
+
+class NetQuerySet(models.QuerySet):
+    """
+    A QuerySet which accepts ipaddress networks anywhere a value is given to
+    a lookup: in filter(), exclude(), get() and Q objects, in lists and in
+    update(). Networks are passed as strings, so a /0 costs no more than a
+    single address
+    """
 
     def filter(self, *args, **kwargs):
-        for key, val in kwargs.items():
-            if isinstance(val, _BaseNetwork):
-                # Django will attempt to consume the _BaseNetwork iterator, which
-                # will convert it to a list of every address in the network
-                kwargs[key] = str_type(val)
-        return super(NetManager, self).filter(*args, **kwargs)
+        return super(NetQuerySet, self).filter(*_normalise_args(args), **_normalise_kwargs(kwargs))
+
+    def exclude(self, *args, **kwargs):
+        return super(NetQuerySet, self).exclude(*_normalise_args(args), **_normalise_kwargs(kwargs))
+
+    def complex_filter(self, filter_obj):
+        if isinstance(filter_obj, Q):
+            filter_obj = _normalise_q(filter_obj)
+        elif isinstance(filter_obj, dict):
+            filter_obj = _normalise_kwargs(filter_obj)
+        return super(NetQuerySet, self).complex_filter(filter_obj)
+
+    def update(self, **kwargs):
+        kwargs = _normalise_kwargs(kwargs)
+        index = prefix_index.get_prefix_index(self.model)
+        if index is None or not set(kwargs) & {index.field.name, index.field.attname}:
+            return super(NetQuerySet, self).update(**kwargs)
+
+        # The same statement returns the new networks, so rows that start
+        # matching while it runs are not missed
+        query = self.query.chain(sql.UpdateQuery) if hasattr(self.query, 'chain') else \
+            self.query.clone(sql.UpdateQuery)
+        query.add_update_values(kwargs)
+        query.annotations = {}
+        if query.related_updates:
+            # Parent tables of multi-table inheritance are updated separately
+            rows = super(NetQuerySet, self).update(**kwargs)
+            transaction.on_commit(index.invalidate, using=self.db)
+            return rows
+
+        self._for_write = True
+        connection = connections[self.db]
+        try:
+            update_sql, params = query.get_compiler(self.db).as_sql()
+        except EmptyResultSet:
+            return 0
+        if not update_sql:
+            return 0
+        update_sql += ' RETURNING %s, %s' % (
+            connection.ops.quote_name(self.model._meta.pk.column), connection.ops.quote_name(index.field.column))
+        with transaction.atomic(using=self.db, savepoint=False):
+            with connection.cursor() as cursor:
+                cursor.execute(update_sql, params)
+                changed = cursor.fetchall()
+        self._result_cache = None
+        index.update_on_commit(changed, self.db)
+        return len(changed)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super(NetQuerySet, self).bulk_create(objs, *args, **kwargs)
+        index = prefix_index.get_prefix_index(self.model)
+        if index is not None:
+            if any(obj.pk is None for obj in objs):
+                # Without primary keys the rows can only be found again by a rebuild
+                transaction.on_commit(index.invalidate, using=self.db)
+            else:
+                attname = index.field.attname
+                index.update_on_commit([(obj.pk, getattr(obj, attname)) for obj in objs], self.db)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        rows = super(NetQuerySet, self).bulk_update(objs, fields, *args, **kwargs)
+        index = prefix_index.get_prefix_index(self.model)
+        if index is not None and set(fields) & {index.field.name, index.field.attname}:
+            attname = index.field.attname
+            index.update_on_commit([(obj.pk, getattr(obj, attname)) for obj in objs], self.db)
+        return rows
+
+    def longest_prefix_match(self, addresses, field='network'):
+        """
+        Return a dict mapping each of the given addresses to the row of this
+        queryset with the most specific network in field containing it, using
+        a single query. Addresses without a matching row are left out
+        """
+        addresses = list(addresses)
+        if not addresses:
+            return {}
+
+        qn = connections[self.db].ops.quote_name
+        opts = self.model._meta
+        table = qn(opts.db_table)
+        column = '%s.%s' % (table, qn(opts.get_field(field).column))
+        pk = '%s.%s' % (table, qn(opts.pk.column))
+
+        params = [[str_type(ip_interface(str_type(address))) for address in addresses]]
+        restrict = ''
+        if self.query.where or self.query.low_mark or self.query.high_mark is not None:
+            try:
+                inner_sql, inner_params = self.order_by().values('pk').query.sql_with_params()
+            except EmptyResultSet:
+                # The queryset can match no row, such as after none()
+                return {}
+            restrict = ' AND %s IN (%s)' % (pk, inner_sql)
+            params.extend(inner_params)
+
+        sql = (
+            'SELECT %(table)s.*, lpm.ordinality AS lpm_ordinality '
+            'FROM unnest(%%s::inet[]) WITH ORDINALITY AS lpm(address, ordinality) '
+            'CROSS JOIN LATERAL ('
+            'SELECT * FROM %(table)s WHERE %(column)s >>= lpm.address%(restrict)s '
+            'ORDER BY masklen(%(column)s) DESC, %(pk)s LIMIT 1'
+            ') AS %(table)s'
+        ) % {'table': table, 'column': column, 'pk': pk, 'restrict': restrict}
+
+        matches = {}
+        for instance in RawQuerySet(sql, model=self.model, params=params, using=self.db):
+            matches[addresses[instance.__dict__.pop('lpm_ordinality') - 1]] = instance
+        return matches
+
+    def annotate_utilisation(self, child_qs, child_field, field='network'):
+        """
+        Return the rows of this queryset, ordered by field, with child_count,
+        used_addresses and utilisation attributes computed from the rows of
+        child_qs whose child_field is under their network, in a single query.
+        used_addresses counts each address once, and utilisation is its
+        percentage of the size of the network
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        table = qn(opts.db_table)
+        column = '%s.%s' % (table, qn(opts.get_field(field).column))
+        pk = '%s.%s' % (table, qn(opts.pk.column))
+        bits = 'CASE FAMILY(%s) WHEN 4 THEN 32 ELSE 128 END'
+
+        child_model_field = child_qs.model._meta.get_field(child_field)
+        if isinstance(child_model_field, CidrAddressField):
+            ranges = 'HOST(value)::inet, HOST(BROADCAST(value))::inet, 2::numeric ^ (%s - MASKLEN(value))' % (
+                bits % 'value')
+            condition = 'value <<= %s' % column
+        else:
+            ranges = 'HOST(value)::inet, HOST(value)::inet, 1::numeric'
+            condition = 'value && %s AND HOST(value)::inet <<= %s' % (column, column)
+
+        # A table can be its own child, but a row is not a child of itself
+        if child_model_field.model._meta.db_table == opts.get_field(field).model._meta.db_table:
+            child_values = (child_field, 'pk')
+            child_columns = 'value, pk'
+            condition += ' AND child.pk <> %s' % pk
+        else:
+            child_values = (child_field,)
+            child_columns = 'value'
+
+        try:
+            child_sql, params = child_qs.order_by().values_list(*child_values).query.sql_with_params()
+        except EmptyResultSet:
+            # child_qs can match no row, such as after none(), so nothing is used
+            child_sql = 'SELECT %s WHERE FALSE' % ', '.join(['NULL::inet'] + [pk] * (len(child_values) - 1))
+            params = ()
+        params = list(params)
+        restrict = ''
+        if self.query.where or self.query.low_mark or self.query.high_mark is not None:
+            try:
+                inner_sql, inner_params = self.order_by().values('pk').query.sql_with_params()
+            except EmptyResultSet:
+                restrict = ' WHERE FALSE'
+            else:
+                restrict = ' WHERE %s IN (%s)' % (pk, inner_sql)
+                params.extend(inner_params)
+
+        # Subnets and hosts sort after the networks containing them, so a
+        # range adds to used_addresses unless an earlier one reaches past it
+        sql = (
+            'SELECT %(table)s.*, usage.child_count, usage.used_addresses, '
+            '(usage.used_addresses * 100 / 2::numeric ^ (%(bits)s - MASKLEN(%(column)s)))::float8 AS utilisation '
+            'FROM %(table)s CROSS JOIN LATERAL ('
+            'SELECT COUNT(*) AS child_count, '
+            'COALESCE(SUM(size) FILTER (WHERE covered IS NULL OR last > covered), 0) AS used_addresses FROM ('
+            'SELECT size, last, MAX(last) OVER (ORDER BY first, last DESC '
+            'ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) AS covered FROM ('
+            'SELECT %(ranges)s FROM (%(child)s) AS child(%(child_columns)s) WHERE %(condition)s'
+            ') AS ranges(first, last, size)'
+            ') AS ordered'
+            ') AS usage%(restrict)s '
+            'ORDER BY %(column)s, %(pk)s'
+        ) % {
+            'table': table, 'column': column, 'pk': pk, 'bits': bits % column, 'ranges': ranges,
+            'child': child_sql, 'child_columns': child_columns, 'condition': condition, 'restrict': restrict,
+        }
+        return RawQuerySet(sql, model=self.model, params=params, using=self.db)
+
+    def _free_ranges(self, field, within, first, last):
+        """
+        Yield the first and last address, as ints, of each run of addresses
+        from first to last that is not used by a row of this queryset, in
+        order. Networks in cidr fields use all of their addresses and values
+        of inet fields use their address
+        """
+        model_field = self.model._meta.get_field(field)
+        within = str_type(within)
+        if isinstance(model_field, CidrAddressField):
+            bounds = 'HOST(value)::inet, HOST(BROADCAST(value))::inet'
+            condition = 'value && %s'
+            condition_params = [within]
+        else:
+            bounds = 'HOST(value)::inet, HOST(value)::inet'
+            condition = 'value && %s AND HOST(value)::inet <<= %s'
+            condition_params = [within, within]
+
+        try:
+            inner_sql, inner_params = self.order_by().values_list(field).query.sql_with_params()
+        except EmptyResultSet:
+            # The queryset can match no row, such as after none(), so nothing is used
+            inner_sql, inner_params = 'SELECT NULL::inet WHERE FALSE', ()
+        first, last = str_type(first), str_type(last)
+
+        # Each row after the first starts a free run if it starts after the
+        # highest address used by the rows before it. The CASE expressions
+        # keep the arithmetic away from the ends of the address space
+        sql = (
+            'WITH used(first, last) AS ('
+            'SELECT GREATEST(first, %%s::inet), LEAST(last, %%s::inet) FROM ('
+            'SELECT %(bounds)s FROM (%(inner)s) AS used_rows(value) WHERE %(condition)s'
+            ') AS ranges(first, last)'
+            ') '
+            'SELECT HOST(free_first), HOST(free_last) FROM ('
+            'SELECT free_first, first - 1 AS free_last FROM ('
+            'SELECT first, CASE WHEN previous IS NULL THEN %%s::inet '
+            'WHEN previous < first THEN previous + 1 END AS free_first FROM ('
+            'SELECT first, MAX(last) OVER (ORDER BY first ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) '
+            'AS previous FROM used'
+            ') AS ordered'
+            ') AS gaps WHERE free_first < first '
+            'UNION ALL '
+            'SELECT free_first, %%s::inet FROM ('
+            'SELECT CASE WHEN MAX(last) IS NULL THEN %%s::inet '
+            'WHEN MAX(last) < %%s::inet THEN MAX(last) + 1 END AS free_first FROM used'
+            ') AS tail WHERE free_first IS NOT NULL'
+            ') AS free ORDER BY free_first'
+        ) % {'bounds': bounds, 'inner': inner_sql, 'condition': condition}
+        params = [first, last] + list(inner_params) + condition_params + [first, last, first, last]
+
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            for free_first, free_last in cursor:
+                yield int(ip_address(free_first)), int(ip_address(free_last))
+
+    def free_subnets(self, parent, prefixlen, limit=None, field='network'):
+        """
+        Return an iterator over up to limit subnets of parent with the given
+        prefix length, in order, that overlap no row of this queryset. The
+        free space is found in the database when iteration starts, so the
+        cost depends on the number of rows in parent rather than its size,
+        and subnets are only built as they are consumed
+        """
+        parent = ip_network(str_type(parent), strict=False)
+        if not parent.prefixlen <= prefixlen <= parent.max_prefixlen:
+            raise ValueError(
+                'prefixlen must be between %d and %d, not %r' % (parent.prefixlen, parent.max_prefixlen, prefixlen)
+            )
+        return self._free_subnets(parent, prefixlen, limit, field)
+
+    def _free_subnets(self, parent, prefixlen, limit, field):
+        if limit is not None and limit <= 0:
+            return
+
+        size = 1 << (parent.max_prefixlen - prefixlen)
+        network_class = type(parent)
+        count = 0
+        ranges = self._free_ranges(field, parent, parent.network_address, parent.broadcast_address)
+        try:
+            for free_first, free_last in ranges:
+                # The first aligned block starting in the free run
+                start = (free_first + size - 1) // size * size
+                while start + size - 1 <= free_last:
+                    yield network_class((start, prefixlen))
+                    count += 1
+                    if count == limit:
+                        return
+                    start += size
+        finally:
+            ranges.close()
+
+    def first_free_address(self, parent, field='network'):
+        """
+        Return the lowest address of parent.hosts() that no row of this
+        queryset uses, or None if they are all in use
+        """
+        parent = ip_network(str_type(parent), strict=False)
+        first, last = parent.network_address, parent.broadcast_address
+        if parent.num_addresses > 2:
+            # Like hosts(), leave out the network address, and the broadcast
+            # address of IPv4 networks
+            first += 1
+            if parent.version == 4:
+                last -= 1
+        ranges = self._free_ranges(field, parent, first, last)
+        free = next(ranges, None)
+        ranges.close()
+        if free is None:
+            return None
+        return type(first)(free[0])
+
+
+class NetManager(models.Manager.from_queryset(NetQuerySet)):
+    use_for_related_fields = True
+
+    def __init__(self, cache_prefix_index=False):
+        super(NetManager, self).__init__()
+        self.cache_prefix_index = cache_prefix_index
+
+    def contribute_to_class(self, cls, name):
+        super(NetManager, self).contribute_to_class(cls, name)
+        if self.cache_prefix_index and not cls._meta.abstract:
+            # True indexes the first cidr, or else inet, field
+            field_name = None if self.cache_prefix_index is True else self.cache_prefix_index
+            prefix_index.register(cls, field_name)
+
+    def prefix_index(self):
+        """
+        Return the in-process PrefixIndex of the model, enabled with
+        cache_prefix_index
+        """
+        index = prefix_index.get_prefix_index(self.model)
+        if index is None:
+            raise ValueError('%s has no prefix index; use NetManager(cache_prefix_index=True)' % self.model.__name__)
+        return index
@@ -0,0 +1,174 @@
+import threading
+from ipaddress import _BaseNetwork, ip_network
+
+from django.db import transaction
+from django.db.models.signals import class_prepared, post_delete, post_save
+
+from netfields.fields import CidrAddressField, InetAddressField
+from netfields.trie import PrefixTree
+
+
+_registry = {}
+
+
+def _network(value):
+    if value is None or isinstance(value, _BaseNetwork):
+        return value
+    return ip_network(str(value), strict=False)
+
+
+class PrefixIndex(object):
+    """
+    An in-process PrefixTree of the networks in a field of a model, mapping
+    each network to the frozenset of primary keys of the rows holding it. It
+    is built on first use and kept up to date from saves and deletes once
+    their transaction commits. Changes it cannot follow increase the version,
+    and the index is rebuilt when it is next used.
+
+    Writes made by other processes are not seen: multi-process deployments
+    must call invalidate() themselves when another process changes the table
+    """
+
+    def __init__(self, model, field_name=None):
+        self.model = model
+        self.field_name = field_name
+        self.version = 0
+        self._built_version = None
+        self._tree = None
+        self._networks = {}
+        self._lock = threading.RLock()
+
+    @property
+    def field(self):
+        if self.field_name is not None:
+            return self.model._meta.get_field(self.field_name)
+        for field_class in (CidrAddressField, InetAddressField):
+            for field in self.model._meta.concrete_fields:
+                if isinstance(field, field_class):
+                    return field
+        raise ValueError('%s has no cidr or inet field to index' % self.model.__name__)
+
+    def invalidate(self):
+        """Mark the index as stale, for changes made without signals"""
+        with self._lock:
+            self.version += 1
+
+    def tree(self):
+        """Return the PrefixTree, rebuilding it if the index is stale"""
+        with self._lock:
+            if self._built_version != self.version:
+                self._rebuild()
+            return self._tree
+
+    def _rebuild(self):
+        version = self.version
+        rows = self.model._base_manager.values_list('pk', self.field.attname).iterator()
+        networks = {}
+        groups = {}
+        for pk, value in rows:
+            network = _network(value)
+            if network is not None:
+                networks[pk] = network
+                groups.setdefault(network, set()).add(pk)
+        self._tree = PrefixTree((network, frozenset(pks)) for network, pks in groups.items())
+        self._networks = networks
+        self._built_version = version
+
+    def update(self, pk, value):
+        """Move a row to the given network, or remove it if value is None"""
+        with self._lock:
+            if self._built_version != self.version:
+                # Rebuilt on next use anyway
+                return
+            network = _network(value)
+            previous = self._networks.pop(pk, None)
+            if previous is not None:
+                pks = self._tree[previous] - {pk}
+                if pks:
+                    self._tree[previous] = pks
+                else:
+                    del self._tree[previous]
+            if network is not None:
+                self._networks[pk] = network
+                try:
+                    pks = self._tree[network]
+                except KeyError:
+                    pks = frozenset()
+                self._tree[network] = pks | {pk}
+
+    def update_on_commit(self, rows, using=None):
+        """Apply (pk, value) pairs once the current transaction commits"""
+        rows = list(rows)
+
+        def apply():
+            for pk, value in rows:
+                self.update(pk, value)
+        transaction.on_commit(apply, using=using)
+
+    def longest_prefix_match(self, address, default=None):
+        """Return the most specific network containing the address and its primary keys"""
+        with self._lock:
+            return self.tree().longest_prefix_match(address, default)
+
+    def covering(self, network):
+        """Return the networks containing or equal to a network and their primary keys"""
+        with self._lock:
+            return list(self.tree().covering(network))
+
+    def covered(self, network):
+        """Return the networks contained in or equal to a network and their primary keys"""
+        with self._lock:
+            return list(self.tree().covered(network))
+
+
+def register(model, field_name=None):
+    """
+    Keep a PrefixIndex for a model. Proxy models and multi-table inheritance
+    children share the index of the model
+    """
+    concrete_model = model._meta.concrete_model
+    if concrete_model is None:
+        # Managers are added before the model class is complete
+        def prepared(sender, **kwargs):
+            register(sender, field_name)
+        class_prepared.connect(prepared, sender=model, weak=False)
+        return
+    if concrete_model not in _registry:
+        _registry[concrete_model] = PrefixIndex(concrete_model, field_name)
+    _connect(model)
+    # Subclasses inherit managers without contribute_to_class()
+    class_prepared.connect(_class_prepared, dispatch_uid='netfields.prefix_index')
+
+
+def _connect(model):
+    # Receivers are connected per model, since a post_delete receiver for
+    # every sender would stop Django from using fast deletes anywhere
+    post_save.connect(_post_save, sender=model)
+    post_delete.connect(_post_delete, sender=model)
+
+
+def _class_prepared(sender, **kwargs):
+    if get_prefix_index(sender) is not None:
+        _connect(sender)
+
+
+def get_prefix_index(model):
+    """Return the PrefixIndex registered for a model or one of its parents, or None"""
+    opts = model._meta
+    for candidate in [opts.concrete_model] + list(opts.get_parent_list()):
+        index = _registry.get(candidate)
+        if index is not None:
+            return index
+    return None
+
+
+def _post_save(sender, instance, using=None, **kwargs):
+    index = get_prefix_index(sender)
+    if index is not None:
+        index.update_on_commit([(instance.pk, getattr(instance, index.field.attname))], using)
+
+
+def _post_delete(sender, instance, using=None, **kwargs):
+    index = get_prefix_index(sender)
+    if index is not None:
+        index.update_on_commit([(instance.pk, None)], using)
@@ -1,6 +1,10 @@
+from ipaddress import ip_interface, ip_network
+
 import psycopg2.extensions
 from psycopg2.extras import Inet
- 
+
+from netfields.mac import mac8_from_canonical, mac_from_canonical
+
 
 class Macaddr(Inet):
     """
@@ -50,4 +54,86 @@ MACADDRARRAY8 = psycopg2.extensions.new_array_type(
     'MACADDRARRAY8',
     psycopg2.extensions.UNICODE,
 )
-psycopg2.extensions.register_type(MACADDRARRAY8)
\ No newline at end of file
+psycopg2.extensions.register_type(MACADDRARRAY8)
+
+
+# Optional typecasters returning the final Python types. These are not
+# registered globally since they would also change the values seen by
+# anything else reading inet columns, such as GenericIPAddressField
+INET_OID = 869
+INETARRAY_OID = 1041
+CIDR_OID = 650
+MACADDR_OID = 829
+MACADDR8_OID = 774
+
+
+def _cast_inet(value, cursor):
+    if value is None:
+        return None
+    return ip_interface(value)
+
+
+def _cast_cidr(value, cursor):
+    if value is None:
+        return None
+    return ip_network(value)
+
+
+def _cast_macaddr(value, cursor):
+    if value is None:
+        return None
+    return mac_from_canonical(value)
+
+
+def _cast_macaddr8(value, cursor):
+    if value is None:
+        return None
+    return mac8_from_canonical(value)
+
+
+INET_TYPED = psycopg2.extensions.new_type((INET_OID,), 'INET_TYPED', _cast_inet)
+INETARRAY_TYPED = psycopg2.extensions.new_array_type(
+    (INETARRAY_OID,),
+    'INETARRAY_TYPED',
+    INET_TYPED,
+)
+CIDR_TYPED = psycopg2.extensions.new_type((CIDR_OID,), 'CIDR_TYPED', _cast_cidr)
+CIDRARRAY_TYPED = psycopg2.extensions.new_array_type(
+    (CIDRARRAY_OID,),
+    'CIDRARRAY_TYPED',
+    CIDR_TYPED,
+)
+MACADDR_TYPED = psycopg2.extensions.new_type((MACADDR_OID,), 'MACADDR_TYPED', _cast_macaddr)
+MACADDRARRAY_TYPED = psycopg2.extensions.new_array_type(
+    (MACADDRARRAY_OID,),
+    'MACADDRARRAY_TYPED',
+    MACADDR_TYPED,
+)
+MACADDR8_TYPED = psycopg2.extensions.new_type((MACADDR8_OID,), 'MACADDR8_TYPED', _cast_macaddr8)
+MACADDRARRAY8_TYPED = psycopg2.extensions.new_array_type(
+    (MACADDRARRAY8_OID,),
+    'MACADDRARRAY8_TYPED',
+    MACADDR8_TYPED,
+)
+
+TYPECASTERS = (
+    INET_TYPED,
+    INETARRAY_TYPED,
+    CIDR_TYPED,
+    CIDRARRAY_TYPED,
+    MACADDR_TYPED,
+    MACADDRARRAY_TYPED,
+    MACADDR8_TYPED,
+    MACADDRARRAY8_TYPED,
+)
+
+
+def register_typecasters(conn_or_curs=None):
+    """
+    Register typecasters that convert inet, cidr, macaddr and macaddr8 values
+    (and arrays of them) to ipaddress and EUI objects in the driver, so the
+    fields do not need to parse them again. If conn_or_curs is None the
+    typecasters are registered globally
+    """
+    for typecaster in TYPECASTERS:
+        psycopg2.extensions.register_type(typecaster, conn_or_curs)
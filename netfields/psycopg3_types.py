@@ -1,6 +1,26 @@
+from ipaddress import (
+    IPv4Address,
+    IPv4Interface,
+    IPv4Network,
+    IPv6Address,
+    IPv6Interface,
+    IPv6Network,
+    ip_interface,
+    ip_network,
+)
+
+from netaddr import EUI
 from psycopg.adapt import Dumper, Loader
+from psycopg.pq import Format
 from psycopg.postgres import adapters
 
+from netfields.mac import mac_unix_common, mac_eui64, mac_from_canonical, mac8_from_canonical
+
+
+# Address family markers used by the inet/cidr binary wire format
+PGSQL_AF_INET = 2
+PGSQL_AF_INET6 = 3
+
 
 class Inet(str):
     def __repr__(self):
@@ -15,6 +35,77 @@ class Macaddr8(Inet):
     pass
 
 
+def _pack_inet(version, prefixlen, is_cidr, packed):
+    """
+    Build the binary representation of an inet/cidr value: family, mask
+    bits, cidr flag and address length followed by the address bytes
+    """
+    family = PGSQL_AF_INET if version == 4 else PGSQL_AF_INET6
+    return bytes((family, prefixlen, is_cidr, len(packed))) + packed
+
+
+class _InetBinaryDumper(Dumper):
+    format = Format.BINARY
+    oid = adapters.types['inet'].oid
+
+    def dump(self, obj):
+        return _pack_inet(obj.version, obj.max_prefixlen, 0, obj.packed)
+
+
+class _InterfaceBinaryDumper(_InetBinaryDumper):
+    def dump(self, obj):
+        return _pack_inet(obj.version, obj.network.prefixlen, 0, obj.packed)
+
+
+class _CidrBinaryDumper(Dumper):
+    format = Format.BINARY
+    oid = adapters.types['cidr'].oid
+
+    def dump(self, obj):
+        return _pack_inet(obj.version, obj.prefixlen, 1, obj.network_address.packed)
+
+
+class _InetBinaryLoader(Loader):
+    """
+    Load inet and cidr values sent in binary format straight into the types
+    used by InetAddressField and CidrAddressField. Unlike the loaders shipped
+    with psycopg, inet values are always loaded as interfaces, even when the
+    mask covers the whole address
+    """
+    format = Format.BINARY
+
+    def load(self, data):
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        address = data[4:]
+        bits = data[1]
+        if data[2]:
+            if data[0] == PGSQL_AF_INET:
+                return IPv4Network((address, bits))
+            return IPv6Network((address, bits))
+        if data[0] == PGSQL_AF_INET:
+            return IPv4Interface((address, bits))
+        return IPv6Interface((address, bits))
+
+
+class _InetTextLoader(Loader):
+    """
+    Load inet values sent in text format, as Django's cursors fetch them,
+    as interfaces, even when the mask covers the whole address
+    """
+    def load(self, data):
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return ip_interface(data.decode())
+
+
+class _CidrTextLoader(Loader):
+    def load(self, data):
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return ip_network(data.decode())
+
+
 class _MacaddrDumper(Dumper):
     oid = adapters.types['macaddr'].oid
 
@@ -43,7 +134,94 @@ class _Macaddr8Loader(Loader):
         return Macaddr8(data.decode())
 
 
+class _EUIDumper(Dumper):
+    """
+    Dump EUI objects as macaddr or macaddr8 according to the address version
+    """
+    oid = adapters.types['macaddr'].oid
+
+    def dump(self, obj):
+        return str(obj).encode()
+
+    def get_key(self, obj, format):
+        return (self.cls, obj.version)
+
+    def upgrade(self, obj, format):
+        dumper = self.__class__(self.cls)
+        if obj.version == 64:
+            dumper.oid = adapters.types['macaddr8'].oid
+        return dumper
+
+
+class _EUIBinaryDumper(_EUIDumper):
+    format = Format.BINARY
+
+    def dump(self, obj):
+        return obj.packed
+
+
+class _MacaddrTextLoader(Loader):
+    """
+    Load macaddr values sent in text format, as Django's cursors fetch them,
+    as EUI objects without going through netaddr's format detection
+    """
+    def load(self, data):
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return mac_from_canonical(data.decode())
+
+
+class _Macaddr8TextLoader(Loader):
+    def load(self, data):
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return mac8_from_canonical(data.decode())
+
+
+class _MacaddrBinaryLoader(Loader):
+    format = Format.BINARY
+
+    def load(self, data):
+        return EUI(int.from_bytes(data, 'big'), version=48, dialect=mac_unix_common)
+
+
+class _Macaddr8BinaryLoader(Loader):
+    format = Format.BINARY
+
+    def load(self, data):
+        return EUI(int.from_bytes(data, 'big'), version=64, dialect=mac_eui64)
+
+
+# Text adapters. The EUI dumper is needed by the fields, and psycopg has no
+# other adapter for these types
 adapters.register_loader('macaddr', _MacaddrLoader)
 adapters.register_loader('macaddr8', _Macaddr8Loader)
 adapters.register_dumper(Macaddr, _MacaddrDumper)
 adapters.register_dumper(Macaddr8, _Macaddr8Dumper)
+adapters.register_dumper(EUI, _EUIDumper)
+
+
+def register_adapters(context=None):
+    """
+    Register the loaders and dumpers that convert inet, cidr, macaddr and
+    macaddr8 values to and from ipaddress and EUI objects in the driver, for
+    results fetched in text format, as by the ORM, or binary format. context
+    is a connection or cursor. If it is None the adapters are registered
+    globally
+    """
+    context = adapters if context is None else context.adapters
+    context.register_loader('inet', _InetTextLoader)
+    context.register_loader('cidr', _CidrTextLoader)
+    context.register_loader('inet', _InetBinaryLoader)
+    context.register_loader('cidr', _InetBinaryLoader)
+    context.register_dumper(IPv4Address, _InetBinaryDumper)
+    context.register_dumper(IPv6Address, _InetBinaryDumper)
+    context.register_dumper(IPv4Interface, _InterfaceBinaryDumper)
+    context.register_dumper(IPv6Interface, _InterfaceBinaryDumper)
+    context.register_dumper(IPv4Network, _CidrBinaryDumper)
+    context.register_dumper(IPv6Network, _CidrBinaryDumper)
+    context.register_loader('macaddr', _MacaddrTextLoader)
+    context.register_loader('macaddr8', _Macaddr8TextLoader)
+    context.register_loader('macaddr', _MacaddrBinaryLoader)
+    context.register_loader('macaddr8', _Macaddr8BinaryLoader)
+    context.register_dumper(EUI, _EUIBinaryDumper)
@@ -0,0 +1,224 @@
+from array import array
+from ipaddress import IPv4Network, IPv6Network, _BaseAddress, _BaseNetwork, ip_interface, ip_network
+
+
+_NETWORK_CLASSES = {4: IPv4Network, 6: IPv6Network}
+_BITS = {4: 32, 6: 128}
+
+
+def _network_key(value):
+    """Return the network address as an int, prefix length and version"""
+    if not isinstance(value, _BaseNetwork):
+        # Interfaces, as read from inet fields, stand for their network
+        value = ip_network(str(value), strict=False)
+    return int(value.network_address), value.prefixlen, value.version
+
+
+def _address_key(value):
+    """Return the address as an int and version"""
+    if not isinstance(value, _BaseAddress):
+        value = ip_interface(str(value)).ip
+    return int(value), value.version
+
+
+class _BinaryTrie(object):
+    """
+    A binary trie over the bits of one address family. Nodes are indexes into
+    two arrays of child indexes, with 0 for no child since the root is never a
+    child, and only nodes holding a value have an entry in the values dict.
+    Nodes pruned by remove() are kept in a free list and reused
+    """
+    __slots__ = ('bits', 'zero', 'one', 'values', 'free')
+
+    def __init__(self, bits):
+        self.bits = bits
+        self.zero = array('I', [0])
+        self.one = array('I', [0])
+        self.values = {}
+        self.free = []
+
+    def find(self, key, prefixlen, create=False):
+        """Return the node for a prefix, or 0 if it is not in the trie"""
+        zero = self.zero
+        one = self.one
+        node = 0
+        shift = self.bits - 1
+        for depth in range(prefixlen):
+            children = one if key >> (shift - depth) & 1 else zero
+            child = children[node]
+            if not child:
+                if not create:
+                    return 0
+                if self.free:
+                    child = self.free.pop()
+                else:
+                    child = len(zero)
+                    zero.append(0)
+                    one.append(0)
+                children[node] = child
+            node = child
+        return node
+
+    def remove(self, key, prefixlen):
+        """
+        Remove the value of a prefix, and the nodes left without a value or
+        children on the path to it. Returns whether the prefix had a value
+        """
+        zero = self.zero
+        one = self.one
+        values = self.values
+        path = []
+        node = 0
+        shift = self.bits - 1
+        for depth in range(prefixlen):
+            children = one if key >> (shift - depth) & 1 else zero
+            path.append((node, children))
+            node = children[node]
+            if not node:
+                return False
+        if node not in values:
+            return False
+        del values[node]
+        while path and node not in values and not zero[node] and not one[node]:
+            parent, children = path.pop()
+            children[parent] = 0
+            self.free.append(node)
+            node = parent
+        return True
+
+    def covering(self, key, prefixlen):
+        """Yield the depth and node of each valued node on the path to a prefix"""
+        zero = self.zero
+        one = self.one
+        values = self.values
+        node = 0
+        shift = self.bits - 1
+        if node in values:
+            yield 0, node
+        for depth in range(prefixlen):
+            node = (one if key >> (shift - depth) & 1 else zero)[node]
+            if not node:
+                return
+            if node in values:
+                yield depth + 1, node
+
+    def covered(self, node, key, depth):
+        """Yield the key, depth and node of each valued node below node"""
+        zero = self.zero
+        one = self.one
+        values = self.values
+        stack = [(node, key, depth)]
+        while stack:
+            node, key, depth = stack.pop()
+            if node in values:
+                yield key, depth, node
+            if depth == self.bits:
+                # Host prefixes have no children
+                continue
+            bit = 1 << (self.bits - depth - 1)
+            if one[node]:
+                stack.append((one[node], key | bit, depth + 1))
+            if zero[node]:
+                stack.append((zero[node], key, depth + 1))
+
+
+class PrefixTree(object):
+    """
+    A map from IPv4 and IPv6 networks to values, answering longest prefix
+    match, covering and covered queries in time proportional to the prefix
+    length. Keys may be networks, interfaces (which stand for their network)
+    or strings
+    """
+
+    def __init__(self, items=()):
+        self._tries = {4: _BinaryTrie(32), 6: _BinaryTrie(128)}
+        for network, value in items:
+            self[network] = value
+
+    @classmethod
+    def from_queryset(cls, queryset, field, value=None):
+        """
+        Build a tree from the networks in field of each row of a queryset. The
+        values are the model instances, or the given attribute of each row
+        """
+        if value is None:
+            rows = ((getattr(instance, field), instance) for instance in queryset.iterator())
+        else:
+            rows = queryset.values_list(field, value).iterator()
+        return cls(network_value for network_value in rows if network_value[0] is not None)
+
+    def __setitem__(self, network, value):
+        key, prefixlen, version = _network_key(network)
+        trie = self._tries[version]
+        trie.values[trie.find(key, prefixlen, create=True)] = value
+
+    def __getitem__(self, network):
+        key, prefixlen, version = _network_key(network)
+        trie = self._tries[version]
+        node = trie.find(key, prefixlen)
+        if node in trie.values and (node or not prefixlen):
+            return trie.values[node]
+        raise KeyError(network)
+
+    def __delitem__(self, network):
+        key, prefixlen, version = _network_key(network)
+        if not self._tries[version].remove(key, prefixlen):
+            raise KeyError(network)
+
+    def __contains__(self, network):
+        try:
+            self[network]
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        return sum(len(trie.values) for trie in self._tries.values())
+
+    def _network(self, version, key, prefixlen):
+        bits = _BITS[version] - prefixlen
+        return _NETWORK_CLASSES[version](((key >> bits) << bits, prefixlen))
+
+    def longest_prefix_match(self, address, default=None):
+        """
+        Return the network and value of the most specific prefix containing
+        the address, or default if there is none
+        """
+        key, version = _address_key(address)
+        trie = self._tries[version]
+        match = None
+        for match in trie.covering(key, trie.bits):
+            pass
+        if match is None:
+            return default
+        depth, node = match
+        return self._network(version, key, depth), trie.values[node]
+
+    def covering(self, network):
+        """
+        Yield the network and value of each prefix containing or equal to the
+        given network, from the least to the most specific
+        """
+        key, prefixlen, version = _network_key(network)
+        trie = self._tries[version]
+        for depth, node in trie.covering(key, prefixlen):
+            yield self._network(version, key, depth), trie.values[node]
+
+    def covered(self, network):
+        """
+        Yield the network and value of each prefix contained in or equal to
+        the given network, in address order
+        """
+        key, prefixlen, version = _network_key(network)
+        trie = self._tries[version]
+        node = trie.find(key, prefixlen)
+        if not node and prefixlen:
+            return
+        for key, depth, node in trie.covered(node, key, prefixlen):
+            yield self._network(version, key, depth), trie.values[node]
+
+    def items(self):
+        """Yield every network and value, IPv4 first, in address order"""
+        for network in (IPv4Network('0.0.0.0/0'), IPv6Network('::/0')):
+            for item in self.covered(network):
+                yield item
@@ -1,8 +1,16 @@
 from django import VERSION
 from django.contrib.postgres.fields import ArrayField
-from django.db.models import CASCADE, ForeignKey, Model
+from django.db.models import CASCADE, CharField, ForeignKey, Model
 
-from netfields import CidrAddressField, InetAddressField, MACAddress8Field, MACAddressField, NetManager
+from netfields import (
+    AddressPoolField,
+    CidrAddressField,
+    InetAddressField,
+    MACAddress8Field,
+    MACAddressField,
+    NetArrayField,
+    NetManager,
+)
 
 
 class InetTestModel(Model):
@@ -61,6 +69,41 @@ class UniqueCidrTestModel(Model):
         db_table = 'uniquecidr'
 
 
+class CompactInetTestModel(Model):
+    field = InetAddressField(value_class='compact')
+    objects = NetManager()
+
+    class Meta:
+        db_table = 'compactinet'
+
+
+class CompactNoPrefixInetTestModel(Model):
+    field = InetAddressField(store_prefix_length=False, value_class='compact')
+    objects = NetManager()
+
+    class Meta:
+        db_table = 'compactnoprefixinet'
+
+
+class CompactCidrTestModel(Model):
+    field = CidrAddressField(value_class='compact')
+    objects = NetManager()
+
+    class Meta:
+        db_table = 'compactcidr'
+
+
+class LazyTestModel(Model):
+    inet = InetAddressField(lazy=True, null=True)
+    cidr = CidrAddressField(lazy=True, null=True)
+    mac = MACAddressField(lazy=True, null=True)
+    mac8 = MACAddress8Field(lazy=True, null=True)
+    objects = NetManager()
+
+    class Meta:
+        db_table = 'lazy'
+
+
 class MACTestModel(Model):
     field = MACAddressField(null=True)
     objects = NetManager()
@@ -105,6 +148,45 @@ class MAC8ArrayTestModel(Model):
         db_table = 'mac8array'
 
 
+class PrefixIndexTestModel(Model):
+    name = CharField(max_length=20, blank=True)
+    network = CidrAddressField(null=True)
+    objects = NetManager(cache_prefix_index=True)
+
+    class Meta:
+        db_table = 'prefixindex'
+
+
+class PrefixIndexProxyTestModel(PrefixIndexTestModel):
+    class Meta:
+        proxy = True
+
+
+class PrefixIndexChildTestModel(PrefixIndexTestModel):
+    site = CharField(max_length=20, blank=True)
+
+    class Meta:
+        db_table = 'prefixindexchild'
+
+
+class AddressPoolTestModel(Model):
+    network = CidrAddressField()
+    pool = AddressPoolField()
+
+    class Meta:
+        db_table = 'addresspool'
+
+
+class NetArrayTestModel(Model):
+    inet = NetArrayField(InetAddressField(), blank=True, null=True)
+    cidr = NetArrayField(CidrAddressField(), blank=True, null=True)
+    mac = NetArrayField(MACAddressField(), blank=True, null=True)
+    mac8 = NetArrayField(MACAddress8Field(), blank=True, null=True)
+
+    class Meta:
+        db_table = 'netarray'
+
+
 class AggregateTestModel(Model):
     network = CidrAddressField(blank=True, null=True, default=None)
     inet = InetAddressField(blank=True, null=True, default=None)
@@ -122,6 +204,7 @@ class AggregateTestChildModel(Model):
 
 if VERSION >= (4, 1):
     from django.db.models import F, Q, CheckConstraint
+    from netfields.indexes import InetGistIndex, InetSpGistIndex, family_index, prefixlen_index
 
 
     class ConstraintModel(Model):
@@ -135,3 +218,20 @@ if VERSION >= (4, 1):
                     name='inet_contained',
                 ),
             )
+            indexes = (
+                InetGistIndex(fields=('network',), name='constraint_network_idx'),
+            )
+
+
+    class IndexTestModel(Model):
+        inet = InetAddressField()
+        cidr = CidrAddressField()
+
+        class Meta:
+            db_table = 'index'
+            indexes = (
+                InetGistIndex(fields=('inet',), family=4, include=('cidr',), name='index_inet4_idx'),
+                InetSpGistIndex(fields=('cidr',), name='index_cidr_idx'),
+                prefixlen_index('cidr', name='index_cidr_prefixlen_idx'),
+                family_index('cidr', name='index_cidr_family_idx'),
+            )
@@ -0,0 +1,382 @@
+from ipaddress import (
+    IPv4Address,
+    IPv4Interface,
+    IPv4Network,
+    IPv6Interface,
+    IPv6Network,
+)
+
+from netaddr import EUI
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from unittest import mock, skipUnless
+
+from netfields.compat import is_psycopg3
+from netfields.mac import (
+    is_canonical_mac,
+    is_canonical_mac8,
+    mac8_from_canonical,
+    mac_eui64,
+    mac_from_canonical,
+    mac_unix_common,
+)
+from test.models import (
+    CidrTestModel,
+    InetArrayTestModel,
+    InetTestModel,
+    MACTestModel,
+    MAC8TestModel,
+    NoPrefixInetTestModel,
+)
+from netfields import (
+    CidrAddressField,
+    InetAddressField,
+    MACAddressField,
+    MACAddress8Field,
+)
+from netfields.fields import Inet
+
+
+class TestTypedDbValues(TestCase):
+    def test_inet_from_db_value_keeps_interface(self):
+        field = InetTestModel._meta.get_field('field')
+        value = IPv4Interface('10.1.2.3/24')
+        self.assertIs(field.from_db_value(value, None, connection), value)
+
+    def test_noprefix_inet_from_db_value_strips_prefix(self):
+        field = NoPrefixInetTestModel._meta.get_field('field')
+        value = IPv4Interface('10.1.2.3/24')
+        self.assertEqual(field.from_db_value(value, None, connection), IPv4Address('10.1.2.3'))
+
+    def test_cidr_from_db_value_keeps_network(self):
+        field = CidrTestModel._meta.get_field('field')
+        value = IPv6Network('2001:db8::/32')
+        self.assertIs(field.from_db_value(value, None, connection), value)
+
+    def test_mac_from_db_value_keeps_eui(self):
+        field = MACTestModel._meta.get_field('field')
+        value = EUI('00:aa:2b:c3:dd:44', dialect=mac_unix_common)
+        self.assertIs(field.from_db_value(value, None, connection), value)
+
+    def test_mac_to_python_applies_dialect(self):
+        field = MACTestModel._meta.get_field('field')
+        value = field.to_python(EUI('00:aa:2b:c3:dd:44'))
+        self.assertEqual(str(value), '00:aa:2b:c3:dd:44')
+
+    def test_mac8_from_db_value_keeps_eui(self):
+        field = MAC8TestModel._meta.get_field('field')
+        value = EUI('00:aa:2b:c3:dd:44:55:66', dialect=mac_eui64)
+        self.assertIs(field.from_db_value(value, None, connection), value)
+
+
+class TestCanonicalMacParser(TestCase):
+    def test_canonical_formats(self):
+        self.assertTrue(is_canonical_mac('00:aa:2b:c3:dd:44'))
+        self.assertTrue(is_canonical_mac('00:AA:2B:C3:DD:44'))
+        self.assertTrue(is_canonical_mac8('00:aa:2b:c3:dd:44:55:66'))
+        for value in ('00-aa-2b-c3-dd-44', '00:aa:2b:c3:dd:4', '0_:aa:2b:c3:dd:44', '00:aa:2b:c3:dd:44\n'):
+            self.assertFalse(is_canonical_mac(value))
+        self.assertFalse(is_canonical_mac8('00:aa:2b:c3:dd:44'))
+
+    def test_mac_from_canonical(self):
+        value = mac_from_canonical('00:aa:2b:c3:dd:44')
+        self.assertEqual(value, EUI('00:aa:2b:c3:dd:44'))
+        self.assertIs(value.dialect, mac_unix_common)
+        self.assertEqual(str(value), '00:aa:2b:c3:dd:44')
+
+    def test_mac8_from_canonical(self):
+        value = mac8_from_canonical('00:aa:2b:c3:dd:44:55:66')
+        self.assertEqual(value, EUI('00:aa:2b:c3:dd:44:55:66'))
+        self.assertIs(value.dialect, mac_eui64)
+        self.assertEqual(str(value), '00:aa:2b:c3:dd:44:55:66')
+
+    def test_fields_use_fast_path(self):
+        with mock.patch('netfields.fields.mac_from_canonical', wraps=mac_from_canonical) as parser:
+            value = MACTestModel._meta.get_field('field').to_python('00:aa:2b:c3:dd:44')
+        self.assertEqual(str(value), '00:aa:2b:c3:dd:44')
+        parser.assert_called_once_with('00:aa:2b:c3:dd:44')
+        with mock.patch('netfields.fields.mac8_from_canonical', wraps=mac8_from_canonical) as parser:
+            value = MAC8TestModel._meta.get_field('field').to_python('00:aa:2b:c3:dd:44:55:66')
+        self.assertEqual(str(value), '00:aa:2b:c3:dd:44:55:66')
+        parser.assert_called_once_with('00:aa:2b:c3:dd:44:55:66')
+
+    def test_fields_fall_back_to_general_parser(self):
+        value = MACTestModel._meta.get_field('field').to_python('00-AA-2B-C3-DD-44')
+        self.assertEqual(str(value), '00:aa:2b:c3:dd:44')
+        value = MAC8TestModel._meta.get_field('field').to_python('00:aa:2b:c3:dd:44')
+        self.assertEqual(str(value), '00:aa:2b:ff:fe:c3:dd:44')
+
+
+class TestWritePath(TestCase):
+    def test_array_context(self):
+        self.assertFalse(InetTestModel._meta.get_field('field').is_array_base_field)
+        self.assertTrue(InetArrayTestModel._meta.get_field('field').base_field.is_array_base_field)
+        self.assertTrue(InetAddressField().is_array_base_field)
+
+    def test_prep_value_serialises_typed_values(self):
+        field = InetTestModel._meta.get_field('field')
+        self.assertEqual(field.get_db_prep_value(IPv4Interface('10.1.2.3/24'), connection), '10.1.2.3/24')
+        value = field.get_db_prep_value('10.1.2.3/24', connection, prepared=True)
+        self.assertIsInstance(value, Inet)
+        self.assertEqual(str(value), '10.1.2.3/24')
+
+    def test_noprefix_prep_value(self):
+        field = NoPrefixInetTestModel._meta.get_field('field')
+        value = IPv4Address('10.1.2.3')
+        self.assertIs(field.to_python(value), value)
+        self.assertEqual(field.get_prep_value(IPv4Interface('10.1.2.3/24')), '10.1.2.3')
+        self.assertEqual(field.get_prep_value(IPv4Address('10.1.2.3')), '10.1.2.3')
+
+    def test_array_base_field_wraps_values(self):
+        field = InetArrayTestModel._meta.get_field('field')
+        value = field.get_db_prep_value([IPv4Interface('10.1.2.3/24'), None], connection)
+        self.assertIsInstance(value[0], Inet)
+        self.assertEqual(str(value[0]), '10.1.2.3/24')
+        self.assertIsNone(value[1])
+
+    def test_bulk_create_typed_values(self):
+        InetTestModel.objects.bulk_create([
+            InetTestModel(field=IPv4Interface('10.1.2.%d/24' % i)) for i in range(5)
+        ])
+        self.assertEqual(
+            sorted(str(v) for v in InetTestModel.objects.values_list('field', flat=True)),
+            ['10.1.2.%d/24' % i for i in range(5)]
+        )
+
+
+class TestParseCache(TestCase):
+    def test_disabled_by_default(self):
+        field = InetAddressField()
+        self.assertIsNone(field.parse_cache_info())
+        self.assertIsNot(
+            field.from_db_value('10.1.2.3/24', None, connection),
+            field.from_db_value('10.1.2.3/24', None, connection),
+        )
+
+    def test_deconstruct(self):
+        self.assertEqual(InetAddressField(parse_cache=64).deconstruct()[3]['parse_cache'], 64)
+        self.assertEqual(MACAddressField(parse_cache=64).clone().parse_cache, 64)
+        self.assertNotIn('parse_cache', CidrAddressField().deconstruct()[3])
+
+    def test_inet_values_are_interned(self):
+        field = InetAddressField(parse_cache=2)
+        value = field.from_db_value('10.1.2.3/24', None, connection)
+        self.assertEqual(value, IPv4Interface('10.1.2.3/24'))
+        self.assertIs(field.from_db_value('10.1.2.3/24', None, connection), value)
+        field.from_db_value('10.1.2.4/24', None, connection)
+        field.from_db_value('10.1.2.5/24', None, connection)
+        info = field.parse_cache_info()
+        self.assertEqual((info.hits, info.misses, info.maxsize, info.currsize), (1, 3, 2, 2))
+
+    def test_noprefix_inet_values_are_interned(self):
+        field = InetAddressField(store_prefix_length=False, parse_cache=16)
+        value = field.from_db_value('10.1.2.3/24', None, connection)
+        self.assertEqual(value, IPv4Address('10.1.2.3'))
+        self.assertIs(field.from_db_value('10.1.2.3/24', None, connection), value)
+
+    def test_cidr_and_mac_values_are_interned(self):
+        for field, raw in (
+            (CidrAddressField(parse_cache=16), '10.1.2.0/24'),
+            (MACAddressField(parse_cache=16), '00:aa:2b:c3:dd:44'),
+            (MACAddress8Field(parse_cache=16), '00:aa:2b:c3:dd:44:55:66'),
+        ):
+            value = field.from_db_value(raw, None, connection)
+            self.assertEqual(str(value), raw)
+            self.assertIs(field.from_db_value(raw, None, connection), value)
+
+    def test_invalid_values_are_not_cached(self):
+        field = CidrAddressField(parse_cache=16)
+        with self.assertRaises(ValidationError):
+            field.from_db_value('10.1.2.3/24', None, connection)
+        self.assertEqual(field.parse_cache_info().currsize, 0)
+
+
+@skipUnless(is_psycopg3, 'Binary adapters are only available with psycopg 3')
+class TestPsycopg3BinaryAdapters(TestCase):
+    def execute_binary(self, sql, params=None):
+        import psycopg
+        from netfields.psycopg3_types import register_adapters
+
+        connection.ensure_connection()
+        with psycopg.Cursor(connection.connection) as cursor:
+            register_adapters(cursor)
+            cursor.execute(sql, params, binary=True)
+            return cursor.fetchone()
+
+    def test_not_registered_globally(self):
+        import psycopg
+
+        connection.ensure_connection()
+        with psycopg.Cursor(connection.connection) as cursor:
+            cursor.execute("SELECT '10.1.2.3'::inet", binary=True)
+            self.assertEqual(cursor.fetchone(), (IPv4Address('10.1.2.3'),))
+
+    def test_load_inet(self):
+        row = self.execute_binary(
+            "SELECT '10.1.2.3/24'::inet, '10.1.2.3'::inet, '2001:db8::1/64'::inet"
+        )
+        self.assertEqual(row, (
+            IPv4Interface('10.1.2.3/24'),
+            IPv4Interface('10.1.2.3/32'),
+            IPv6Interface('2001:db8::1/64'),
+        ))
+        self.assertIsInstance(row[1], IPv4Interface)
+
+    def test_load_cidr(self):
+        row = self.execute_binary("SELECT '10.1.2.0/24'::cidr, '2001:db8::/32'::cidr")
+        self.assertEqual(row, (IPv4Network('10.1.2.0/24'), IPv6Network('2001:db8::/32')))
+
+    def test_dump_binary(self):
+        values = [
+            IPv4Interface('10.1.2.3/24'),
+            IPv6Interface('2001:db8::1/64'),
+            IPv4Address('10.1.2.3'),
+            IPv4Network('10.1.2.0/24'),
+            IPv6Network('2001:db8::/32'),
+        ]
+        row = self.execute_binary(
+            'SELECT %b::text, %b::text, %b::text, %b::text, %b::text', values
+        )
+        self.assertEqual(row, (
+            '10.1.2.3/24', '2001:db8::1/64', '10.1.2.3/32', '10.1.2.0/24', '2001:db8::/32'
+        ))
+
+    def test_roundtrip_through_model(self):
+        instance = InetTestModel.objects.create(field='10.1.2.3/24')
+        row = self.execute_binary('SELECT field FROM inet WHERE id = %s', [instance.pk])
+        self.assertIs(InetTestModel._meta.get_field('field').from_db_value(row[0], None, connection), row[0])
+
+    def test_load_macaddr(self):
+        row = self.execute_binary(
+            "SELECT '00:aa:2b:c3:dd:44'::macaddr, '00:aa:2b:c3:dd:44:55:66'::macaddr8"
+        )
+        self.assertEqual(row, (EUI('00:aa:2b:c3:dd:44'), EUI('00:aa:2b:c3:dd:44:55:66')))
+        self.assertEqual(str(row[0]), '00:aa:2b:c3:dd:44')
+        self.assertEqual(str(row[1]), '00:aa:2b:c3:dd:44:55:66')
+
+    def test_dump_macaddr_binary(self):
+        row = self.execute_binary(
+            'SELECT %b::text, %b::text, pg_typeof(%b)::text, pg_typeof(%b)::text',
+            [
+                EUI('00:aa:2b:c3:dd:44'),
+                EUI('00:aa:2b:c3:dd:44:55:66'),
+                EUI('00:aa:2b:c3:dd:44'),
+                [EUI('00:aa:2b:c3:dd:44:55:66')],
+            ]
+        )
+        self.assertEqual(row, ('00:aa:2b:c3:dd:44', '00:aa:2b:c3:dd:44:55:66', 'macaddr', 'macaddr8[]'))
+
+    def test_dump_macaddr_text(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_typeof(%s)::text, pg_typeof(%s)::text, pg_typeof(%s)::text',
+                [EUI('00:aa:2b:c3:dd:44'), [EUI('00:aa:2b:c3:dd:44')], [EUI('00:aa:2b:c3:dd:44:55:66')]]
+            )
+            self.assertEqual(cursor.fetchone(), ('macaddr', 'macaddr[]', 'macaddr8[]'))
+
+
+@skipUnless(is_psycopg3, 'Adapters are only available with psycopg 3')
+class TestPsycopg3TextAdapters(TransactionTestCase):
+    def setUp(self):
+        from netfields.psycopg3_types import register_adapters
+
+        connection.ensure_connection()
+        register_adapters(connection.connection)
+        # The adapters stay on the connection, so do not reuse it
+        self.addCleanup(connection.close)
+
+    def test_orm_cursor(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT '10.1.2.3'::inet, '10.1.2.0/24'::cidr, ARRAY['2001:db8::1/64']::inet[]")
+            row = cursor.fetchone()
+        self.assertEqual(row, (IPv4Interface('10.1.2.3/32'), IPv4Network('10.1.2.0/24'), [IPv6Interface('2001:db8::1/64')]))
+        self.assertIsInstance(row[0], IPv4Interface)
+
+    def test_queryset(self):
+        InetTestModel.objects.create(field='10.1.2.3/24')
+        NoPrefixInetTestModel.objects.create(field='10.1.2.3')
+        CidrTestModel.objects.create(field='10.1.2.0/24')
+        with mock.patch('netfields.fields.ip_interface') as parse:
+            self.assertEqual(InetTestModel.objects.get().field, IPv4Interface('10.1.2.3/24'))
+        self.assertFalse(parse.called)
+        self.assertEqual(NoPrefixInetTestModel.objects.get().field, IPv4Address('10.1.2.3'))
+        self.assertEqual(CidrTestModel.objects.values_list('field', flat=True).get(), IPv4Network('10.1.2.0/24'))
+
+    def test_mac_queryset(self):
+        MACTestModel.objects.create(field='00:aa:2b:c3:dd:44')
+        MAC8TestModel.objects.create(field='00:aa:2b:c3:dd:44:55:66')
+        with mock.patch('netfields.fields.is_canonical_mac') as detect:
+            value = MACTestModel.objects.get().field
+        self.assertFalse(detect.called)
+        self.assertEqual(value, EUI('00:aa:2b:c3:dd:44'))
+        self.assertIs(value.dialect, mac_unix_common)
+        with mock.patch('netfields.fields.is_canonical_mac8') as detect:
+            value = MAC8TestModel.objects.get().field
+        self.assertFalse(detect.called)
+        self.assertEqual(value, EUI('00:aa:2b:c3:dd:44:55:66'))
+        self.assertIs(value.dialect, mac_eui64)
+
+    def test_mac_cursor(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT '00:aa:2b:c3:dd:44'::macaddr, ARRAY['00:aa:2b:c3:dd:44:55:66']::macaddr8[]")
+            row = cursor.fetchone()
+        self.assertEqual(row, (EUI('00:aa:2b:c3:dd:44'), [EUI('00:aa:2b:c3:dd:44:55:66')]))
+        self.assertIsInstance(row[0], EUI)
+
+
+@skipUnless(not is_psycopg3, 'Typecasters are only available with psycopg2')
+class TestPsycopg2Typecasters(TestCase):
+    def fetchone(self, sql, params=None):
+        from netfields.psycopg2_types import register_typecasters
+
+        with connection.cursor() as cursor:
+            register_typecasters(cursor.cursor)
+            cursor.execute(sql, params)
+            return cursor.fetchone()
+
+    def test_cast_scalars(self):
+        row = self.fetchone(
+            "SELECT '10.1.2.3/24'::inet, '2001:db8::/32'::cidr, "
+            "'00:aa:2b:c3:dd:44'::macaddr, '00:aa:2b:c3:dd:44:55:66'::macaddr8, NULL::inet"
+        )
+        self.assertEqual(row, (
+            IPv4Interface('10.1.2.3/24'),
+            IPv6Network('2001:db8::/32'),
+            EUI('00:aa:2b:c3:dd:44'),
+            EUI('00:aa:2b:c3:dd:44:55:66'),
+            None,
+        ))
+        self.assertEqual(str(row[2]), '00:aa:2b:c3:dd:44')
+        self.assertEqual(str(row[3]), '00:aa:2b:c3:dd:44:55:66')
+
+    def test_cast_macaddr_skips_format_detection(self):
+        from netfields import psycopg2_types
+
+        with mock.patch.object(psycopg2_types, 'mac_from_canonical', wraps=mac_from_canonical) as parse, \
+                mock.patch.object(psycopg2_types, 'mac8_from_canonical', wraps=mac8_from_canonical) as parse8:
+            row = self.fetchone(
+                "SELECT ARRAY['00:aa:2b:c3:dd:44']::macaddr[], '00:aa:2b:c3:dd:44:55:66'::macaddr8"
+            )
+        self.assertEqual(row, ([EUI('00:aa:2b:c3:dd:44')], EUI('00:aa:2b:c3:dd:44:55:66')))
+        parse.assert_called_once_with('00:aa:2b:c3:dd:44')
+        parse8.assert_called_once_with('00:aa:2b:c3:dd:44:55:66')
+
+    def test_cast_arrays(self):
+        row = self.fetchone(
+            "SELECT ARRAY['10.1.2.3/24', NULL]::inet[], ARRAY['10.1.2.0/24']::cidr[], "
+            "ARRAY['00:aa:2b:c3:dd:44']::macaddr[], ARRAY['00:aa:2b:c3:dd:44:55:66']::macaddr8[]"
+        )
+        self.assertEqual(row, (
+            [IPv4Interface('10.1.2.3/24'), None],
+            [IPv4Network('10.1.2.0/24')],
+            [EUI('00:aa:2b:c3:dd:44')],
+            [EUI('00:aa:2b:c3:dd:44:55:66')],
+        ))
+
+    def test_from_db_value_keeps_typed_values(self):
+        instance = MACTestModel.objects.create(field='00:aa:2b:c3:dd:44')
+        row = self.fetchone('SELECT field FROM mac WHERE id = %s', [instance.pk])
+        field = MACTestModel._meta.get_field('field')
+        self.assertIs(field.from_db_value(row[0], None, connection), row[0])
@@ -0,0 +1,121 @@
+import threading
+from ipaddress import ip_address
+
+from django.core import checks
+from django.db import connection
+from django.db.models import Model
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import isolate_apps
+
+from netfields import AddressPoolField, InetAddressField
+from test.models import AddressPoolTestModel
+
+
+class TestAddressPoolField(TestCase):
+    def setUp(self):
+        self.field = AddressPoolTestModel._meta.get_field('pool')
+        self.pool = AddressPoolTestModel.objects.create(network='10.0.0.0/30')
+
+    def test_allocate(self):
+        self.assertEqual(self.field.allocate(self.pool), ip_address('10.0.0.0'))
+        self.assertEqual(self.field.allocate(self.pool), ip_address('10.0.0.1'))
+        self.assertEqual(self.pool.pool, '1100')
+        self.assertEqual(self.field.allocate(self.pool), ip_address('10.0.0.2'))
+        self.assertEqual(self.field.allocate(self.pool), ip_address('10.0.0.3'))
+        self.assertIsNone(self.field.allocate(self.pool))
+
+    def test_free(self):
+        self.field.allocate(self.pool)
+        self.field.allocate(self.pool)
+        self.assertTrue(self.field.free(self.pool, '10.0.0.0'))
+        self.assertFalse(self.field.free(self.pool, '10.0.0.0'))
+        self.assertFalse(self.field.free(self.pool, '10.0.0.2'))
+        self.assertFalse(self.field.free(self.pool, '192.168.0.1'))
+        self.assertFalse(self.field.free(self.pool, '2001:db8::1'))
+        self.assertEqual(self.field.allocate(self.pool), ip_address('10.0.0.0'))
+
+    def test_free_empty_pool(self):
+        self.assertFalse(self.field.free(self.pool, '10.0.0.1'))
+        self.assertIsNone(AddressPoolTestModel.objects.get(pk=self.pool.pk).pool)
+
+    def test_is_allocated(self):
+        self.assertFalse(self.field.is_allocated(self.pool, '10.0.0.1'))
+        self.field.allocate(self.pool)
+        self.field.allocate(self.pool)
+        self.assertTrue(self.field.is_allocated(self.pool, '10.0.0.1/24'))
+        self.assertFalse(self.field.is_allocated(self.pool, '10.0.0.2'))
+        self.assertFalse(self.field.is_allocated(self.pool, '10.0.1.1'))
+
+    def test_save_after_allocate(self):
+        self.field.allocate(self.pool)
+        self.pool.network = '10.0.0.0/30'
+        self.pool.save()
+        self.assertEqual(AddressPoolTestModel.objects.get(pk=self.pool.pk).pool, '1000')
+
+    def test_ipv6(self):
+        pool = AddressPoolTestModel.objects.create(network='2001:db8::/120')
+        self.field.allocate(pool)
+        self.assertEqual(self.field.allocate(pool), ip_address('2001:db8::1'))
+        self.assertEqual(len(pool.pool), 256)
+
+    def test_large_pool(self):
+        pool = AddressPoolTestModel.objects.create(network='10.0.0.0/16')
+        for _ in range(3):
+            self.field.allocate(pool)
+        self.assertEqual(self.field.allocate(pool), ip_address('10.0.0.3'))
+        self.assertEqual(len(pool.pool), 65536)
+
+    def test_too_large_pool(self):
+        pool = AddressPoolTestModel.objects.create(network='10.0.0.0/7')
+        with self.assertRaises(ValueError):
+            self.field.allocate(pool)
+        with self.assertRaises(ValueError):
+            self.field.is_allocated(pool, '10.0.0.1')
+        pool = AddressPoolTestModel.objects.create(network='2001:db8::/64')
+        with self.assertRaises(ValueError):
+            self.field.free(pool, '2001:db8::1')
+        self.assertIsNone(AddressPoolTestModel.objects.get(pk=pool.pk).pool)
+
+    def test_verbose_name(self):
+        field = AddressPoolField('DHCP pool', network_field='prefix')
+        self.assertEqual(field.verbose_name, 'DHCP pool')
+        self.assertEqual(field.network_field, 'prefix')
+
+    def test_deconstruct(self):
+        name, path, args, kwargs = AddressPoolField(network_field='prefix').deconstruct()
+        self.assertEqual(path, 'netfields.fields.AddressPoolField')
+        self.assertEqual(kwargs, {'network_field': 'prefix'})
+
+    @isolate_apps('test')
+    def test_check_network_field(self):
+        class Pool(Model):
+            network = InetAddressField()
+            pool = AddressPoolField()
+
+        errors = Pool._meta.get_field('pool').check()
+        self.assertEqual([error.id for error in errors], ['netfields.E001'])
+        self.assertIsInstance(errors[0], checks.Error)
+
+
+class TestConcurrentPoolAllocation(TransactionTestCase):
+    def test_concurrent(self):
+        pool = AddressPoolTestModel.objects.create(network='10.0.0.0/24')
+        field = AddressPoolTestModel._meta.get_field('pool')
+        allocated = []
+
+        def allocate():
+            try:
+                instance = AddressPoolTestModel.objects.get(pk=pool.pk)
+                for _ in range(5):
+                    allocated.append(field.allocate(instance))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=allocate) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(allocated), [ip_address('10.0.0.%d' % i) for i in range(50)])
+        self.assertEqual(AddressPoolTestModel.objects.get(pk=pool.pk).pool, '1' * 50 + '0' * 206)
@@ -0,0 +1,142 @@
+from ipaddress import collapse_addresses, ip_interface, ip_network
+from unittest import skipIf
+
+from django import VERSION
+from django.db.models import Q
+from django.test import TestCase
+
+from netfields.aggregates import CollapseNetworks, InetMergeAgg, MaxInet, MinInet
+from test.models import (
+    AggregateTestChildModel,
+    AggregateTestModel,
+    CidrTestModel,
+    InetTestModel,
+    NullCidrTestModel,
+)
+
+
+class TestMinMaxInet(TestCase):
+    def test_cidr(self):
+        for network in ('10.0.0.0/8', '10.0.0.0/16', '192.168.0.0/24'):
+            CidrTestModel.objects.create(field=network)
+        result = CidrTestModel.objects.aggregate(lowest=MinInet('field'), highest=MaxInet('field'))
+        self.assertEqual(result, {
+            'lowest': ip_network('10.0.0.0/8'),
+            'highest': ip_network('192.168.0.0/24'),
+        })
+
+    def test_inet(self):
+        for address in ('10.0.0.2/24', '10.0.0.1/24', '2001:db8::1/64'):
+            InetTestModel.objects.create(field=address)
+        result = InetTestModel.objects.aggregate(lowest=MinInet('field'), highest=MaxInet('field'))
+        self.assertEqual(result, {
+            'lowest': ip_interface('10.0.0.1/24'),
+            'highest': ip_interface('2001:db8::1/64'),
+        })
+
+    def test_empty(self):
+        self.assertEqual(CidrTestModel.objects.aggregate(lowest=MinInet('field')), {'lowest': None})
+
+
+class TestInetMergeAgg(TestCase):
+    def test_cidr(self):
+        for network in ('10.0.0.0/24', '10.0.3.0/24', '10.0.1.128/25'):
+            CidrTestModel.objects.create(field=network)
+        self.assertEqual(
+            CidrTestModel.objects.aggregate(merged=InetMergeAgg('field')),
+            {'merged': ip_network('10.0.0.0/22')}
+        )
+
+    def test_inet(self):
+        for address in ('192.168.0.1/32', '192.168.1.200/32'):
+            InetTestModel.objects.create(field=address)
+        self.assertEqual(
+            InetTestModel.objects.aggregate(merged=InetMergeAgg('field')),
+            {'merged': ip_network('192.168.0.0/23')}
+        )
+
+    def test_mixed_families(self):
+        CidrTestModel.objects.create(field='10.0.0.0/24')
+        CidrTestModel.objects.create(field='2001:db8::/32')
+        self.assertEqual(CidrTestModel.objects.aggregate(merged=InetMergeAgg('field')), {'merged': None})
+
+    def test_group_by(self):
+        first = AggregateTestModel.objects.create()
+        second = AggregateTestModel.objects.create()
+        for parent, network in ((first, '10.0.0.0/24'), (first, '10.0.1.0/24'), (second, '2001:db8::/48')):
+            AggregateTestChildModel.objects.create(parent=parent, network=network, inet=network)
+        qs = (
+            AggregateTestChildModel.objects
+            .values('parent')
+            .annotate(merged=InetMergeAgg('network'))
+            .order_by('parent')
+        )
+        self.assertEqual(
+            [row['merged'] for row in qs],
+            [ip_network('10.0.0.0/23'), ip_network('2001:db8::/48')]
+        )
+
+    @skipIf(VERSION < (2, 0), 'Aggregate filters require Django 2.0+')
+    def test_filter(self):
+        for network in ('10.0.0.0/24', '10.0.1.0/24', '2001:db8::/32'):
+            CidrTestModel.objects.create(field=network)
+        self.assertEqual(
+            CidrTestModel.objects.aggregate(merged=InetMergeAgg('field', filter=Q(field__family=4))),
+            {'merged': ip_network('10.0.0.0/23')}
+        )
+
+
+class TestCollapseNetworks(TestCase):
+    def assertCollapses(self, networks):
+        NullCidrTestModel.objects.all().delete()
+        for network in networks:
+            NullCidrTestModel.objects.create(field=network)
+        expected = (
+            list(collapse_addresses(ip_network(n) for n in networks if n and ':' not in n)) +
+            list(collapse_addresses(ip_network(n) for n in networks if n and ':' in n))
+        )
+        self.assertEqual(
+            NullCidrTestModel.objects.aggregate(networks=CollapseNetworks('field')),
+            {'networks': expected}
+        )
+
+    def test_collapse(self):
+        self.assertCollapses([
+            '10.0.0.0/24', '10.0.1.0/24', '10.0.1.0/25', '192.168.0.0/24', '192.168.0.0/24', '2001:db8::/32',
+        ])
+
+    def test_collapse_repeatedly(self):
+        self.assertCollapses(['10.0.0.0/10', '10.64.0.0/10', '10.128.0.0/9', '10.4.0.0/16'])
+
+    def test_no_siblings(self):
+        self.assertCollapses(['10.0.1.0/24', '10.0.2.0/24', '10.0.4.0/23'])
+
+    def test_whole_space(self):
+        self.assertCollapses(['0.0.0.0/1', '128.0.0.0/1', '::/1', '8000::/1', '10.0.0.0/8'])
+
+    def test_nulls(self):
+        self.assertCollapses([None, '10.0.0.0/25', '10.0.0.128/25'])
+
+    def test_inet(self):
+        InetTestModel.objects.create(field='10.0.0.1/25')
+        InetTestModel.objects.create(field='10.0.0.200/25')
+        self.assertEqual(
+            InetTestModel.objects.aggregate(networks=CollapseNetworks('field')),
+            {'networks': [ip_network('10.0.0.0/24')]}
+        )
+
+    def test_group_by(self):
+        first = AggregateTestModel.objects.create()
+        second = AggregateTestModel.objects.create()
+        for parent, network in ((first, '10.0.0.0/25'), (first, '10.0.0.128/25'), (second, '10.0.0.0/25')):
+            AggregateTestChildModel.objects.create(parent=parent, network=network, inet=network)
+        qs = (
+            AggregateTestChildModel.objects
+            .values('parent')
+            .annotate(networks=CollapseNetworks('network'))
+            .order_by('parent')
+        )
+        self.assertEqual(
+            [row['networks'] for row in qs],
+            [[ip_network('10.0.0.0/24')], [ip_network('10.0.0.0/25')]]
+        )
@@ -0,0 +1,76 @@
+import threading
+from ipaddress import ip_interface, ip_network
+
+from django.db import connection, transaction
+from django.db.transaction import TransactionManagementError
+from django.test import TestCase, TransactionTestCase
+
+from netfields.allocation import allocate_next_address
+from test.models import AggregateTestChildModel, AggregateTestModel, CidrTestModel, InetTestModel
+
+
+class TestAllocateNextAddress(TestCase):
+    def test_allocate(self):
+        InetTestModel.objects.create(field='10.0.0.1/24')
+        first = allocate_next_address('10.0.0.0/24', InetTestModel, 'field')
+        second = allocate_next_address(ip_network('10.0.0.0/24'), InetTestModel, 'field')
+        self.assertEqual(first.field, ip_interface('10.0.0.2/24'))
+        self.assertEqual(InetTestModel.objects.get(pk=second.pk).field, ip_interface('10.0.0.3/24'))
+
+    def test_cidr_field(self):
+        CidrTestModel.objects.create(field='10.0.0.0/25')
+        self.assertEqual(
+            allocate_next_address('10.0.0.0/24', CidrTestModel, 'field').field,
+            ip_network('10.0.0.128/32')
+        )
+
+    def test_defaults(self):
+        parent = AggregateTestModel.objects.create()
+        child = allocate_next_address(
+            '10.0.0.0/24', AggregateTestChildModel, 'inet', defaults={'parent': parent, 'network': '10.0.0.0/24'}
+        )
+        self.assertEqual(child.inet, ip_interface('10.0.0.1/24'))
+        self.assertEqual(child.parent, parent)
+
+    def test_full(self):
+        allocate_next_address('10.0.0.0/30', InetTestModel, 'field')
+        allocate_next_address('10.0.0.0/30', InetTestModel, 'field')
+        with self.assertRaises(ValueError):
+            allocate_next_address('10.0.0.0/30', InetTestModel, 'field')
+
+
+class TestConcurrentAllocation(TransactionTestCase):
+    def test_concurrent(self):
+        errors = []
+
+        def allocate(prefix):
+            try:
+                for _ in range(5):
+                    allocate_next_address(prefix, InetTestModel, 'field')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        # Overlapping prefixes share the lock
+        threads = [
+            threading.Thread(target=allocate, args=(prefix,))
+            for prefix in ['10.0.0.0/16', '10.0.0.0/24'] * 5
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            sorted(str(value.ip) for value in InetTestModel.objects.values_list('field', flat=True)),
+            sorted('10.0.0.%d' % i for i in range(1, 51))
+        )
+
+    def test_isolation_level(self):
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+            with self.assertRaises(TransactionManagementError):
+                allocate_next_address('10.0.0.0/24', InetTestModel, 'field')
@@ -0,0 +1,211 @@
+import pickle
+from ipaddress import (
+    IPv4Address,
+    IPv4Interface,
+    IPv4Network,
+    IPv6Interface,
+    IPv6Network,
+    collapse_addresses,
+    ip_interface,
+)
+
+from django.core.exceptions import ValidationError
+from django.forms import ModelForm
+from django.test import TestCase
+from rest_framework import serializers
+
+from netfields import CidrAddressField, InetAddressField
+from netfields import rest_framework
+from netfields.compact import (
+    CompactAddress,
+    CompactInterface,
+    CompactNetwork,
+    compact_address,
+    compact_interface,
+    compact_network,
+)
+from test.models import (
+    CompactCidrTestModel,
+    CompactInetTestModel,
+    CompactNoPrefixInetTestModel,
+)
+
+
+class TestCompactValues(TestCase):
+    def test_interface(self):
+        value = compact_interface('10.1.2.3/24')
+        self.assertIsInstance(value, CompactInterface)
+        self.assertEqual(str(value), '10.1.2.3/24')
+        self.assertEqual(repr(value), "CompactInterface('10.1.2.3/24')")
+        self.assertEqual(int(value), int(IPv4Address('10.1.2.3')))
+        self.assertEqual(value.version, 4)
+        self.assertEqual(value.to_ipaddress(), IPv4Interface('10.1.2.3/24'))
+
+    def test_ipv6_interface(self):
+        value = compact_interface(IPv6Interface('2001:db8::1/64'))
+        self.assertEqual(str(value), '2001:db8::1/64')
+        self.assertEqual(value.version, 6)
+
+    def test_network(self):
+        value = compact_network('10.1.2.0/24')
+        self.assertIsInstance(value, CompactNetwork)
+        self.assertEqual(str(value), '10.1.2.0/24')
+        self.assertEqual(value.prefixlen, 24)
+        self.assertEqual(value.to_ipaddress(), IPv4Network('10.1.2.0/24'))
+        with self.assertRaises(ValueError):
+            compact_network('10.1.2.3/24')
+
+    def test_address(self):
+        self.assertEqual(str(compact_address('10.1.2.3/24')), '10.1.2.3')
+        self.assertEqual(str(compact_address(compact_interface('10.1.2.3/24'))), '10.1.2.3')
+        self.assertEqual(compact_address('10.1.2.3'), IPv4Address('10.1.2.3'))
+
+    def test_equality_and_hash(self):
+        for compact, value in (
+            (compact_address('10.1.2.3'), IPv4Address('10.1.2.3')),
+            (compact_interface('10.1.2.3/24'), IPv4Interface('10.1.2.3/24')),
+            (compact_interface('2001:db8::1/64'), IPv6Interface('2001:db8::1/64')),
+            (compact_network('10.1.2.0/24'), IPv4Network('10.1.2.0/24')),
+            (compact_network('2001:db8::/32'), IPv6Network('2001:db8::/32')),
+        ):
+            self.assertEqual(compact, value)
+            self.assertEqual(value, compact)
+            self.assertEqual(hash(compact), hash(value))
+            self.assertIn(compact, {value})
+            self.assertIn(value, {compact})
+        self.assertNotEqual(compact_interface('10.1.2.3/24'), compact_interface('10.1.2.3/25'))
+        self.assertNotEqual(compact_interface('10.1.2.3/24'), IPv4Interface('10.1.2.3/25'))
+        self.assertNotEqual(compact_network('10.1.2.0/24'), '10.1.2.0/24')
+
+    def test_ordering(self):
+        values = [compact_interface('10.1.2.4/24'), compact_interface('10.1.2.3/24')]
+        self.assertEqual([str(v) for v in sorted(values)], ['10.1.2.3/24', '10.1.2.4/24'])
+        self.assertLess(compact_network('10.1.2.0/24'), IPv4Network('10.1.3.0/24'))
+
+    def test_delegation(self):
+        value = compact_interface('10.1.2.3/24')
+        self.assertEqual(value.ip, IPv4Address('10.1.2.3'))
+        self.assertEqual(value.network, IPv4Network('10.1.2.0/24'))
+        self.assertEqual(compact_network('10.1.2.0/24').num_addresses, 256)
+        with self.assertRaises(AttributeError):
+            value._private
+
+    def test_special_methods(self):
+        network = compact_network('10.1.2.0/30')
+        self.assertIn(IPv4Address('10.1.2.1'), network)
+        self.assertIn(compact_address('10.1.2.2'), network)
+        self.assertNotIn(compact_address('10.1.3.1'), network)
+        self.assertEqual(list(network), list(IPv4Network('10.1.2.0/30')))
+        self.assertEqual(network[-1], IPv4Address('10.1.2.3'))
+        self.assertEqual(compact_address('10.1.2.3') + 1, IPv4Address('10.1.2.4'))
+        self.assertEqual(compact_address('10.1.2.3') - 1, IPv4Address('10.1.2.2'))
+        with self.assertRaises(TypeError):
+            network + 1
+
+    def test_ipaddress_interoperability(self):
+        network = compact_network('10.1.2.0/24')
+        self.assertTrue(IPv4Network('10.0.0.0/8').overlaps(network))
+        self.assertTrue(network.overlaps(IPv4Network('10.0.0.0/8')))
+        self.assertTrue(IPv4Network('10.0.0.0/8').supernet_of(network))
+        self.assertEqual(
+            list(collapse_addresses([compact_network('10.1.2.0/25'), compact_network('10.1.2.128/25')])),
+            [IPv4Network('10.1.2.0/24')]
+        )
+        self.assertEqual(
+            list(collapse_addresses([compact_interface('10.1.2.0/32'), compact_interface('10.1.2.1/32')])),
+            [IPv4Network('10.1.2.0/31')]
+        )
+
+    def test_slots(self):
+        with self.assertRaises(AttributeError):
+            compact_interface('10.1.2.3/24').__dict__
+
+    def test_pickle(self):
+        value = compact_interface('10.1.2.3/24')
+        self.assertEqual(pickle.loads(pickle.dumps(value)), value)
+
+
+class TestCompactFields(TestCase):
+    def test_deconstruct(self):
+        name, path, args, kwargs = CidrAddressField(value_class='compact').deconstruct()
+        self.assertEqual(kwargs['value_class'], 'compact')
+        self.assertEqual(InetAddressField(value_class='compact').clone().value_class, 'compact')
+        self.assertNotIn('value_class', InetAddressField().deconstruct()[3])
+
+    def test_invalid_value_class(self):
+        with self.assertRaises(ValueError):
+            InetAddressField(value_class='bogus')
+        with self.assertRaises(ValueError):
+            CidrAddressField(value_class='bogus')
+
+    def test_to_python(self):
+        field = CompactInetTestModel._meta.get_field('field')
+        value = compact_interface('10.1.2.3/24')
+        self.assertIs(field.to_python(value), value)
+        self.assertIsInstance(field.to_python(IPv4Interface('10.1.2.3/24')), CompactInterface)
+        self.assertIsInstance(field.to_python('10.1.2.3/24'), CompactInterface)
+        with self.assertRaises(ValidationError):
+            field.to_python('10.1.2.')
+
+    def test_inet_roundtrip(self):
+        CompactInetTestModel.objects.create(field='10.1.2.3/24')
+        CompactInetTestModel.objects.create(field=IPv4Interface('10.1.3.3/24'))
+        values = list(CompactInetTestModel.objects.order_by('field').values_list('field', flat=True))
+        self.assertEqual(values, [IPv4Interface('10.1.2.3/24'), IPv4Interface('10.1.3.3/24')])
+        self.assertIsInstance(values[0], CompactInterface)
+
+    def test_noprefix_inet_roundtrip(self):
+        CompactNoPrefixInetTestModel.objects.create(field='10.1.2.3/24')
+        value = CompactNoPrefixInetTestModel.objects.get().field
+        self.assertIsInstance(value, CompactAddress)
+        self.assertEqual(str(value), '10.1.2.3')
+
+    def test_cidr_roundtrip(self):
+        instance = CompactCidrTestModel.objects.create(field=compact_network('10.1.2.0/24'))
+        instance.refresh_from_db()
+        self.assertIsInstance(instance.field, CompactNetwork)
+        self.assertEqual(instance.field, IPv4Network('10.1.2.0/24'))
+
+    def test_lookups(self):
+        CompactInetTestModel.objects.create(field='10.1.2.3/24')
+        CompactCidrTestModel.objects.create(field='10.1.2.0/24')
+        self.assertTrue(CompactInetTestModel.objects.filter(field=compact_interface('10.1.2.3/24')).exists())
+        self.assertTrue(CompactInetTestModel.objects.filter(
+            field__net_contained=compact_network('10.1.0.0/16')
+        ).exists())
+        self.assertTrue(CompactCidrTestModel.objects.filter(
+            field__net_contains=compact_interface('10.1.2.3/32')
+        ).exists())
+        self.assertTrue(CompactCidrTestModel.objects.filter(
+            field__net_contains=compact_address('10.1.2.3')
+        ).exists())
+
+    def test_form(self):
+        class CompactCidrTestModelForm(ModelForm):
+            class Meta:
+                model = CompactCidrTestModel
+                exclude = []
+
+        form = CompactCidrTestModelForm({'field': '10.1.2.0/24'})
+        self.assertTrue(form.is_valid())
+        instance = form.save()
+        instance.refresh_from_db()
+        self.assertIsInstance(instance.field, CompactNetwork)
+        self.assertEqual(CompactCidrTestModelForm(instance=instance)['field'].value(), instance.field)
+
+    def test_rest_framework(self):
+        class TestSerializer(serializers.Serializer):
+            ip = rest_framework.InetAddressField()
+            cidr = rest_framework.CidrAddressField()
+
+        serializer = TestSerializer({
+            'ip': compact_interface('10.1.2.3/24'),
+            'cidr': compact_network('10.1.2.0/24'),
+        })
+        self.assertEqual(serializer.data, {'ip': '10.1.2.3/24', 'cidr': '10.1.2.0/24'})
+        serializer = TestSerializer(data={
+            'ip': compact_interface('10.1.2.3/24'),
+            'cidr': compact_network('10.1.2.0/24'),
+        })
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data['ip'], ip_interface('10.1.2.3/24'))
@@ -0,0 +1,179 @@
+from django import VERSION
+from django.db import connection
+from django.db.models import F, Model, Q
+from django.test import TestCase
+from django.test.utils import isolate_apps
+from unittest import skipIf
+
+from netfields import CidrAddressField, InetAddressField
+
+
+@skipIf(VERSION < (4, 1), 'Index tests use features from django 4.1 onwards')
+class TestInetIndexes(TestCase):
+    def test_default_opclasses(self):
+        from netfields.indexes import InetGistIndex
+        from test.models import IndexTestModel
+        index = InetGistIndex(fields=['inet', 'cidr'], name='test_idx')
+        self.assertEqual(index.field_opclasses(IndexTestModel), ['inet_ops', 'inet_ops'])
+
+    def test_default_opclasses_other_fields(self):
+        from netfields.indexes import InetGistIndex
+        from test.models import IndexTestModel
+        index = InetGistIndex(fields=['id', 'inet'], name='test_idx')
+        self.assertEqual(index.field_opclasses(IndexTestModel), ['', 'inet_ops'])
+        with connection.schema_editor() as editor:
+            sql = str(index.create_sql(IndexTestModel, editor))
+        self.assertIn('("id" , "inet" inet_ops)', sql)
+        self.assertNotIn('opclasses', index.deconstruct()[2])
+
+    def test_explicit_opclasses(self):
+        from netfields.indexes import InetGistIndex
+        from test.models import IndexTestModel
+        index = InetGistIndex(fields=['inet'], opclasses=['inet_ops'], name='test_idx')
+        self.assertEqual(index.opclasses, ['inet_ops'])
+        self.assertEqual(index.field_opclasses(IndexTestModel), ['inet_ops'])
+        self.assertEqual(index.deconstruct()[2]['opclasses'], ['inet_ops'])
+
+    def test_family(self):
+        from netfields.indexes import InetGistIndex
+        index = InetGistIndex(fields=['inet'], family=6, name='test_idx')
+        self.assertEqual(index.condition, Q(inet__family=6))
+
+    def test_family_with_condition(self):
+        from netfields.indexes import InetSpGistIndex
+        index = InetSpGistIndex(fields=['inet'], family=4, condition=Q(cidr__family=4), name='test_idx')
+        self.assertEqual(index.condition, Q(inet__family=4) & Q(cidr__family=4))
+
+    def test_invalid_family(self):
+        from netfields.indexes import InetGistIndex
+        with self.assertRaises(ValueError):
+            InetGistIndex(fields=['inet'], family=5, name='test_idx')
+
+    def test_deconstruct(self):
+        from netfields.indexes import InetGistIndex
+        index = InetGistIndex(fields=['inet'], family=4, name='test_idx')
+        path, args, kwargs = index.deconstruct()
+        self.assertEqual(path, 'netfields.indexes.InetGistIndex')
+        self.assertEqual(InetGistIndex(*args, **kwargs), index)
+
+    def test_create_sql(self):
+        from test.models import IndexTestModel
+        index = IndexTestModel._meta.indexes[0]
+        with connection.schema_editor() as editor:
+            sql = str(index.create_sql(IndexTestModel, editor))
+        self.assertIn('USING gist ("inet" inet_ops) INCLUDE ("cidr") WHERE "inet" <<= \'0.0.0.0/0\'', sql)
+
+    def test_expression_indexes(self):
+        from netfields.indexes import family_index, prefixlen_index
+        from test.models import IndexTestModel
+        with connection.schema_editor() as editor:
+            self.assertIn(
+                '(MASKLEN("cidr"))',
+                str(prefixlen_index('cidr', name='test_idx').create_sql(IndexTestModel, editor))
+            )
+            self.assertIn(
+                '(FAMILY("cidr"))',
+                str(family_index('cidr', name='test_idx').create_sql(IndexTestModel, editor))
+            )
+
+    def assertUsesIndex(self, qs, name):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn(name, qs.explain())
+
+    def test_family_uses_partial_index(self):
+        from test.models import IndexTestModel
+        self.assertUsesIndex(
+            IndexTestModel.objects.filter(inet__family=4, inet__net_contained='10.0.0.0/8'),
+            'index_inet4_idx'
+        )
+
+    def test_prefixlen_uses_index(self):
+        from test.models import IndexTestModel
+        self.assertUsesIndex(IndexTestModel.objects.filter(cidr__prefixlen__gte=24), 'index_cidr_prefixlen_idx')
+        self.assertUsesIndex(IndexTestModel.objects.filter(cidr__family__in=[4]), 'index_cidr_family_idx')
+
+    def test_indexes_exist(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, 'index')
+        self.assertEqual(constraints['index_inet4_idx']['type'], 'gist')
+        self.assertEqual(constraints['index_cidr_idx']['type'], 'spgist')
+
+
+@skipIf(VERSION < (4, 1), 'Index checks use features from django 4.1 onwards')
+@isolate_apps('test')
+class TestIndexCheck(TestCase):
+    def get_model(self, constraints, indexes=()):
+        class CheckTestModel(Model):
+            inet = InetAddressField()
+            cidr = CidrAddressField()
+
+            class Meta:
+                app_label = 'test'
+
+        CheckTestModel._meta.constraints = constraints
+        CheckTestModel._meta.indexes = indexes
+        return CheckTestModel
+
+    def check(self, model):
+        from netfields.checks import check_model_indexes
+        return [error.id for error in check_model_indexes(model)]
+
+    def test_check_constraint(self):
+        from django.db.models import CheckConstraint
+        model = self.get_model([
+            CheckConstraint(check=Q(cidr__net_contains=F('inet')), name='contained'),
+        ])
+        self.assertEqual(self.check(model), [])
+
+    def test_unique_constraint_condition(self):
+        from django.db.models import UniqueConstraint
+        model = self.get_model([
+            UniqueConstraint(
+                fields=['inet'],
+                condition=Q(cidr__family=4) & ~Q(inet__net_contained='10.0.0.0/8'),
+                name='unique',
+            ),
+        ])
+        self.assertEqual(self.check(model), [])
+
+    def test_exclusion_constraint_with_separate_index(self):
+        from django.contrib.postgres.constraints import ExclusionConstraint
+        from netfields.indexes import InetGistIndex
+        model = self.get_model(
+            [ExclusionConstraint(expressions=[('cidr', '&&')], name='overlap')],
+            [InetGistIndex(fields=['cidr'], name='cidr_idx')],
+        )
+        self.assertEqual(self.check(model), ['netfields.W001'])
+
+    def test_exclusion_constraint_hint(self):
+        from django.contrib.postgres.constraints import ExclusionConstraint
+        from netfields.checks import check_model_indexes
+        model = self.get_model([
+            ExclusionConstraint(expressions=[('inet', '&&'), ('cidr', '=')], name='overlap'),
+        ])
+        error, = check_model_indexes(model)
+        self.assertIn("'inet'", error.msg)
+        self.assertEqual(error.hint, "Use OpClass('inet', name='inet_ops') as the expression.")
+
+    def test_exclusion_constraint_other_operators(self):
+        from django.contrib.postgres.constraints import ExclusionConstraint
+        model = self.get_model([
+            ExclusionConstraint(expressions=[('cidr', '=')], name='equal'),
+        ])
+        self.assertEqual(self.check(model), [])
+
+    def test_exclusion_constraint(self):
+        from django.contrib.postgres.constraints import ExclusionConstraint
+        model = self.get_model([
+            ExclusionConstraint(expressions=[('cidr', '&&')], name='overlap'),
+        ])
+        self.assertEqual(self.check(model), ['netfields.W001'])
+
+    def test_exclusion_constraint_with_opclass(self):
+        from django.contrib.postgres.constraints import ExclusionConstraint
+        from django.contrib.postgres.indexes import OpClass
+        model = self.get_model([
+            ExclusionConstraint(expressions=[(OpClass('cidr', name='inet_ops'), '&&')], name='overlap'),
+        ])
+        self.assertEqual(self.check(model), [])
@@ -0,0 +1,121 @@
+import copy
+import pickle
+from ipaddress import IPv4Address, IPv4Interface, IPv4Network
+
+from netaddr import EUI
+
+from django.db import connection
+from django.test import TestCase
+from unittest import mock
+
+from netfields import InetAddressField
+from netfields.lazy import _UNPARSED, LazyValue
+from test.models import LazyTestModel
+
+
+class TestLazyValue(TestCase):
+    def test_parses_once_on_use(self):
+        parse = mock.Mock(return_value=IPv4Interface('10.1.2.3/24'))
+        value = LazyValue('10.1.2.3/24', parse)
+        self.assertFalse(parse.called)
+        self.assertEqual(value.ip, IPv4Address('10.1.2.3'))
+        self.assertEqual(str(value), '10.1.2.3/24')
+        self.assertEqual(value, IPv4Interface('10.1.2.3/24'))
+        self.assertEqual(hash(value), hash(IPv4Interface('10.1.2.3/24')))
+        parse.assert_called_once_with('10.1.2.3/24')
+
+    def test_network_protocols(self):
+        value = LazyValue('10.1.2.0/30', IPv4Network)
+        self.assertIn(IPv4Address('10.1.2.1'), value)
+        self.assertEqual(len(list(value)), 4)
+        self.assertLess(value, IPv4Network('10.1.3.0/30'))
+
+    def test_special_methods(self):
+        address = LazyValue('10.1.2.3', IPv4Address)
+        self.assertEqual(address + 1, IPv4Address('10.1.2.4'))
+        self.assertEqual(address - 1, IPv4Address('10.1.2.2'))
+        self.assertEqual(IPv4Address('10.1.2.3') + LazyValue('1', int), IPv4Address('10.1.2.4'))
+        self.assertEqual(address + LazyValue('1', int), IPv4Address('10.1.2.4'))
+        self.assertEqual(int(address), int(IPv4Address('10.1.2.3')))
+        self.assertEqual('%s' % address, '10.1.2.3')
+        self.assertEqual('{}'.format(address), '10.1.2.3')
+        network = LazyValue('10.1.2.0/30', IPv4Network)
+        self.assertEqual(len(list(network)), 4)
+        self.assertEqual(network[1], IPv4Address('10.1.2.1'))
+        self.assertTrue(network)
+        mac = LazyValue('00:aa:2b:c3:dd:44', EUI)
+        self.assertEqual(mac[0], 0)
+        self.assertEqual(hex(mac), '0xaa2bc3dd44')
+
+    def test_deconstruct(self):
+        self.assertIs(InetAddressField(lazy=True).deconstruct()[3]['lazy'], True)
+        self.assertIs(InetAddressField(lazy=True).clone().lazy, True)
+        self.assertNotIn('lazy', InetAddressField().deconstruct()[3])
+
+    def test_pickle_and_copy_give_parsed_value(self):
+        value = LazyValue('10.1.2.3/24', IPv4Interface)
+        self.assertIs(type(pickle.loads(pickle.dumps(value))), IPv4Interface)
+        self.assertIs(type(copy.copy(value)), IPv4Interface)
+
+    def test_from_db_value(self):
+        field = InetAddressField(lazy=True)
+        value = field.from_db_value('10.1.2.3/24', None, connection)
+        self.assertIs(type(value), LazyValue)
+        self.assertEqual(field.to_python(value), IPv4Interface('10.1.2.3/24'))
+        typed = IPv4Interface('10.1.2.3/24')
+        self.assertIs(field.from_db_value(typed, None, connection), typed)
+
+
+class TestLazyFields(TestCase):
+    values = {
+        'inet': '10.1.2.3/24',
+        'cidr': '10.1.2.0/24',
+        'mac': '00:aa:2b:c3:dd:44',
+        'mac8': '00:aa:2b:c3:dd:44:55:66',
+    }
+
+    def setUp(self):
+        LazyTestModel.objects.create(**self.values)
+
+    def test_attribute_access_parses(self):
+        instance = LazyTestModel.objects.get()
+        if type(instance.__dict__['inet']) is not LazyValue:
+            self.skipTest('Values were already parsed by the driver')
+        for name in self.values:
+            self.assertIs(type(instance.__dict__[name]), LazyValue)
+        self.assertIs(type(instance.inet), IPv4Interface)
+        self.assertIs(type(instance.__dict__['inet']), IPv4Interface)
+        self.assertIs(type(instance.cidr), IPv4Network)
+        self.assertIs(type(instance.mac), EUI)
+        self.assertEqual(str(instance.mac), self.values['mac'])
+        self.assertEqual(str(instance.mac8), self.values['mac8'])
+
+    def test_save_untouched_values_without_parsing(self):
+        instance = LazyTestModel.objects.get()
+        fields = [LazyTestModel._meta.get_field(name) for name in self.values]
+        with mock.patch.object(InetAddressField, 'to_python') as to_python:
+            instance.save()
+        self.assertFalse(to_python.called)
+        for field in fields:
+            value = instance.__dict__[field.attname]
+            if type(value) is LazyValue:
+                self.assertIs(value._value, _UNPARSED)
+        instance = LazyTestModel.objects.get()
+        for name, value in self.values.items():
+            self.assertEqual(str(getattr(instance, name)), value)
+
+    def test_save_modified_value(self):
+        instance = LazyTestModel.objects.get()
+        instance.inet = '10.9.9.9/16'
+        instance.save()
+        self.assertEqual(LazyTestModel.objects.get().inet, IPv4Interface('10.9.9.9/16'))
+
+    def test_values_list(self):
+        value = LazyTestModel.objects.values_list('cidr', flat=True).get()
+        self.assertEqual(value, IPv4Network('10.1.2.0/24'))
+        self.assertTrue(LazyTestModel.objects.filter(inet__net_contained_or_equal=value).exists())
+        self.assertTrue(LazyTestModel.objects.filter(cidr=value).exists())
+
+    def test_deferred_field(self):
+        instance = LazyTestModel.objects.defer('inet').get()
+        self.assertEqual(instance.inet, IPv4Interface('10.1.2.3/24'))
@@ -0,0 +1,168 @@
+from ipaddress import IPv4Network, ip_network
+from unittest import skipIf
+
+from django import VERSION
+from django.test import TestCase
+
+from test.models import (
+    CidrTestModel,
+    PrefixIndexChildTestModel,
+    PrefixIndexProxyTestModel,
+    PrefixIndexTestModel,
+)
+
+
+@skipIf(VERSION < (3, 2), 'on_commit callbacks can be captured from django 3.2 onwards')
+class TestPrefixIndex(TestCase):
+    def setUp(self):
+        self.index = PrefixIndexTestModel.objects.prefix_index()
+        self.index.invalidate()
+        self.a = PrefixIndexTestModel.objects.create(network='10.0.0.0/8')
+        self.b = PrefixIndexTestModel.objects.create(network='10.1.0.0/16')
+
+    def match(self, address):
+        return self.index.longest_prefix_match(address)
+
+    def test_no_index(self):
+        with self.assertRaises(ValueError):
+            CidrTestModel.objects.prefix_index()
+
+    def test_proxy_shares_index(self):
+        self.assertIs(PrefixIndexProxyTestModel.objects.prefix_index(), self.index)
+
+    def test_build(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.match('10.1.2.3'), (IPv4Network('10.1.0.0/16'), frozenset([self.b.pk])))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.match('10.2.0.1'), (IPv4Network('10.0.0.0/8'), frozenset([self.a.pk])))
+        self.assertIsNone(self.match('192.168.0.1'))
+
+    def test_save_and_delete(self):
+        self.index.tree()
+        with self.captureOnCommitCallbacks(execute=True):
+            c = PrefixIndexTestModel.objects.create(network='10.1.2.0/24')
+            d = PrefixIndexTestModel.objects.create(network='10.1.2.0/24')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.match('10.1.2.3'), (IPv4Network('10.1.2.0/24'), frozenset([c.pk, d.pk])))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            c.network = ip_network('192.168.0.0/16')
+            c.save()
+            d.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.match('10.1.2.3'), (IPv4Network('10.1.0.0/16'), frozenset([self.b.pk])))
+            self.assertEqual(self.match('192.168.0.1'), (IPv4Network('192.168.0.0/16'), frozenset([c.pk])))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            c.network = None
+            c.save()
+        self.assertIsNone(self.match('192.168.0.1'))
+
+    def test_covered_host_routes(self):
+        host = PrefixIndexTestModel.objects.create(network='10.1.2.3/32')
+        self.index.invalidate()
+        self.assertEqual(self.index.covered('10.1.0.0/16'), [
+            (IPv4Network('10.1.0.0/16'), frozenset([self.b.pk])),
+            (IPv4Network('10.1.2.3/32'), frozenset([host.pk])),
+        ])
+        self.assertEqual(self.index.covered('10.1.2.3/32'), [(IPv4Network('10.1.2.3/32'), frozenset([host.pk]))])
+
+    def test_proxy_save(self):
+        self.index.tree()
+        with self.captureOnCommitCallbacks(execute=True):
+            c = PrefixIndexProxyTestModel.objects.create(network='172.16.0.0/12')
+        self.assertEqual(self.match('172.16.0.1'), (IPv4Network('172.16.0.0/12'), frozenset([c.pk])))
+
+    def test_child_model(self):
+        self.assertIs(PrefixIndexChildTestModel.objects.prefix_index(), self.index)
+        self.index.tree()
+        with self.captureOnCommitCallbacks(execute=True):
+            c = PrefixIndexChildTestModel.objects.create(network='172.16.0.0/12', site='a')
+        self.assertEqual(self.match('172.16.0.1'), (IPv4Network('172.16.0.0/12'), frozenset([c.pk])))
+        with self.captureOnCommitCallbacks(execute=True):
+            c.network = '172.17.0.0/16'
+            c.save()
+        self.assertEqual(self.match('172.17.0.1'), (IPv4Network('172.17.0.0/16'), frozenset([c.pk])))
+        with self.captureOnCommitCallbacks(execute=True):
+            c.delete()
+        self.assertIsNone(self.match('172.17.0.1'))
+
+    def test_not_applied_before_commit(self):
+        self.index.tree()
+        with self.captureOnCommitCallbacks(execute=False):
+            PrefixIndexTestModel.objects.create(network='10.1.2.0/24')
+        self.assertEqual(self.match('10.1.2.3')[0], IPv4Network('10.1.0.0/16'))
+
+    def test_bulk_create(self):
+        self.index.tree()
+        with self.captureOnCommitCallbacks(execute=True):
+            objs = PrefixIndexTestModel.objects.bulk_create([
+                PrefixIndexTestModel(network='10.1.2.0/24'),
+                PrefixIndexTestModel(network='2001:db8::/32'),
+            ])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.match('10.1.2.3'), (IPv4Network('10.1.2.0/24'), frozenset([objs[0].pk])))
+            self.assertEqual(self.match('2001:db8::1')[1], frozenset([objs[1].pk]))
+
+    def test_update(self):
+        self.index.tree()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(1):
+                self.assertEqual(PrefixIndexTestModel.objects.filter(pk=self.b.pk).update(network='10.2.0.0/16'), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.match('10.1.2.3')[0], IPv4Network('10.0.0.0/8'))
+            self.assertEqual(self.match('10.2.0.1'), (IPv4Network('10.2.0.0/16'), frozenset([self.b.pk])))
+
+    def test_update_unfiltered(self):
+        self.index.tree()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(1):
+                self.assertEqual(PrefixIndexTestModel.objects.update(network='192.168.0.0/16'), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.match('192.168.0.1'), (IPv4Network('192.168.0.0/16'), frozenset([self.a.pk, self.b.pk])))
+            self.assertIsNone(self.match('10.0.0.1'))
+
+    def test_update_joined_filter(self):
+        self.index.tree()
+        c = PrefixIndexChildTestModel.objects.create(network='172.16.0.0/12', site='a')
+        with self.captureOnCommitCallbacks(execute=True):
+            rows = PrefixIndexTestModel.objects.filter(prefixindexchildtestmodel__site='a').update(
+                network='172.17.0.0/16')
+        self.assertEqual(rows, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.match('172.17.0.1'), (IPv4Network('172.17.0.0/16'), frozenset([c.pk])))
+
+    def test_update_empty(self):
+        self.index.tree()
+        with self.assertNumQueries(0):
+            self.assertEqual(PrefixIndexTestModel.objects.none().update(network='10.2.0.0/16'), 0)
+
+    def test_update_child_model(self):
+        self.index.tree()
+        c = PrefixIndexChildTestModel.objects.create(network='172.16.0.0/12', site='a')
+        with self.captureOnCommitCallbacks(execute=True):
+            PrefixIndexChildTestModel.objects.filter(pk=c.pk).update(network='172.17.0.0/16', site='b')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.match('172.17.0.1'), (IPv4Network('172.17.0.0/16'), frozenset([c.pk])))
+
+    @skipIf(VERSION < (2, 2), 'bulk_update() was added in django 2.2')
+    def test_bulk_update(self):
+        self.index.tree()
+        self.b.network = ip_network('10.2.0.0/16')
+        with self.captureOnCommitCallbacks(execute=True):
+            PrefixIndexTestModel.objects.bulk_update(iter([self.b]), ['network'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.match('10.1.2.3')[0], IPv4Network('10.0.0.0/8'))
+            self.assertEqual(self.match('10.2.0.1'), (IPv4Network('10.2.0.0/16'), frozenset([self.b.pk])))
+
+    def test_update_other_fields(self):
+        self.index.tree()
+        with self.assertNumQueries(1):
+            PrefixIndexTestModel.objects.update(name='x')
+
+    def test_invalidate(self):
+        self.index.tree()
+        PrefixIndexTestModel.objects.filter(pk=self.b.pk)._raw_delete(PrefixIndexTestModel.objects.db)
+        self.index.invalidate()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.match('10.1.2.3')[0], IPv4Network('10.0.0.0/8'))
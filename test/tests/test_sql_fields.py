@@ -15,8 +15,8 @@ from ipaddress import (
 )
 from netaddr import EUI
 
-from django.db import IntegrityError
-from django.db.models import F
+from django.db import IntegrityError, connection
+from django.db.models import F, Q
 from django.core.exceptions import EmptyResultSet, FieldError
 from django.test import TestCase
 from unittest import skipIf
@@ -35,6 +35,7 @@ from test.models import (
     MAC8ArrayTestModel,
     MACTestModel,
     MAC8TestModel,
+    NetArrayTestModel,
     AggregateTestModel,
     AggregateTestChildModel
 )
@@ -50,6 +51,9 @@ class BaseSqlTestCase(object):
             sql.strip().lower()
         )
 
+    def db_type(self):
+        return self.model._meta.get_field('field').db_type(connection)
+
     def compile_queryset(self, qs):
         qs.query.get_compiler(qs.db).as_sql()
 
@@ -86,19 +90,39 @@ class BaseSqlTestCase(object):
     def test_in_lookup(self):
         self.assertSqlEquals(
             self.qs.filter(field__in=[self.value1, self.value2]),
-            self.select + 'WHERE "table"."field" IN (%s, %s)'
+            self.select + 'WHERE "table"."field" = ANY(%%s::%s[])' % self.db_type()
         )
 
     def test_in_single_lookup(self):
         self.assertSqlEquals(
             self.qs.filter(field__in=[self.value1]),
-            self.select + 'WHERE "table"."field" IN (%s)'
+            self.select + 'WHERE "table"."field" = ANY(%%s::%s[])' % self.db_type()
         )
 
     def test_in_empty_lookup(self):
         with self.assertRaises(EmptyResultSet):
             self.qs.filter(field__in=[]).query.get_compiler(self.qs.db).as_sql()
 
+    def test_in_none_lookup(self):
+        with self.assertRaises(EmptyResultSet):
+            self.qs.filter(field__in=[None]).query.get_compiler(self.qs.db).as_sql()
+
+    def test_in_lookup_single_parameter(self):
+        qs = self.qs.filter(field__in=(value for value in [self.value1, None, self.value2]))
+        sql, params = qs.query.get_compiler(qs.db).as_sql()
+        field = self.model._meta.get_field('field')
+        self.assertEqual(params, ([field.get_prep_value(self.value1), field.get_prep_value(self.value2)],))
+
+    def test_in_lookup_values(self):
+        self.model.objects.create(field=self.value1)
+        self.model.objects.create(field=self.value3)
+        self.assertEqual(self.qs.filter(field__in=[self.value1, self.value2]).count(), 1)
+
+    def test_in_subquery_lookup(self):
+        qs = self.qs.filter(field__in=self.qs.values('field'))
+        sql, params = qs.query.get_compiler(qs.db).as_sql()
+        self.assertIn('"field" IN (SELECT U0."field"', sql)
+
     def test_gt_lookup(self):
         self.assertSqlEquals(
             self.qs.filter(field__gt=self.value1),
@@ -182,16 +206,66 @@ class BaseInetTestCase(BaseSqlTestCase):
             self.select + 'WHERE "table"."field" && %s',
         )
 
+    def test_net_contained_any(self):
+        self.assertSqlEquals(
+            self.qs.filter(field__net_contained_any=['10.0.0.0/24', ip_network('10.2.0.0/16')]),
+            self.select + 'WHERE "table"."field" << ANY(%s::cidr[])'
+        )
+
+    def test_net_contained_or_equal_any(self):
+        self.assertSqlEquals(
+            self.qs.filter(field__net_contained_or_equal_any=['10.0.0.0/24']),
+            self.select + 'WHERE "table"."field" <<= ANY(%s::cidr[])'
+        )
+
+    def test_net_contains_any(self):
+        self.assertSqlEquals(
+            self.qs.filter(field__net_contains_any=['10.0.0.1', '10.0.0.2']),
+            self.select + 'WHERE "table"."field" >> ANY(%s::inet[])'
+        )
+
+    def test_net_contains_or_equals_any(self):
+        self.assertSqlEquals(
+            self.qs.filter(field__net_contains_or_equals_any=['10.0.0.1']),
+            self.select + 'WHERE "table"."field" >>= ANY(%s::inet[])'
+        )
+
+    def test_net_overlaps_any(self):
+        self.assertSqlEquals(
+            self.qs.filter(field__net_overlaps_any=['10.0.0.0/24']),
+            self.select + 'WHERE "table"."field" && ANY(%s::cidr[])'
+        )
+
+    def test_any_lookup_single_parameter(self):
+        values = ['10.%d.0.0/16' % i for i in range(100)]
+        query = self.qs.filter(field__net_contained_any=iter(values)).query
+        sql, params = query.get_compiler(self.qs.db).as_sql()
+        self.assertEqual(params, (values,))
+
     def test_family_lookup(self):
         self.assertSqlEquals(
             self.qs.filter(field__family=4),
+            self.select + 'WHERE "table"."field" <<= %s'
+        )
+
+    def test_family_lookup_other_value(self):
+        self.assertSqlEquals(
+            self.qs.filter(field__family=5),
             self.select + 'WHERE family("table"."field") = %s'
         )
 
+    def test_family_lookup_values(self):
+        self.model.objects.create(field=self.value1)
+        self.model.objects.create(field='2001:db8::/64')
+        self.assertEqual(self.qs.filter(field__family=4).count(), 1)
+        self.assertEqual(self.qs.filter(field__family='6').count(), 1)
+        self.assertEqual(self.qs.exclude(field__family=6).count(), 1)
+        self.assertEqual(self.qs.filter(field__family__gt=4).count(), 1)
+
     def test_host_lookup_sql(self):
         self.assertSqlEquals(
             self.qs.filter(field__host="10.0.0.1"),
-            self.select + 'WHERE HOST("table"."field") = HOST(%s)'
+            self.select + 'WHERE ("table"."field" >>= HOST(%s)::inet AND HOST("table"."field") = HOST(%s))'
         )
 
     def test_prefixlen_exact_lookup_sql(self):
@@ -264,13 +338,25 @@ class BaseInetFieldTestCase(BaseInetTestCase):
     def test_startswith_lookup(self):
         self.assertSqlEquals(
             self.qs.filter(field__startswith='10.'),
+            self.select + 'WHERE ("table"."field" && %s AND HOST("table"."field") LIKE %s)'
+        )
+
+    def test_startswith_lookup_not_on_boundary(self):
+        self.assertSqlEquals(
+            self.qs.filter(field__startswith='10'),
             self.select + 'WHERE HOST("table"."field") LIKE %s'
         )
 
     def test_istartswith_lookup(self):
         self.assertSqlEquals(
             self.qs.filter(field__istartswith='10.'),
-            self.select + 'WHERE HOST("table"."field") LIKE UPPER(%s)'
+            self.select + 'WHERE ("table"."field" && %s AND HOST("table"."field") LIKE UPPER(%s))'
+        )
+
+    def test_startswith_lookup_non_ascii_digits(self):
+        self.assertSqlEquals(
+            self.qs.filter(field__startswith='\u0661\u0660.'),
+            self.select + 'WHERE HOST("table"."field") LIKE %s'
         )
 
     def test_endswith_lookup(self):
@@ -297,6 +383,12 @@ class BaseInetFieldTestCase(BaseInetTestCase):
             self.select + 'WHERE HOST("table"."field") ~* %s'
         )
 
+    def test_anchored_regex_lookup(self):
+        self.assertSqlEquals(
+            self.qs.filter(field__regex=r'^10\.20\.'),
+            self.select + 'WHERE ("table"."field" && %s AND HOST("table"."field") ~ %s)'
+        )
+
     def test_query_filter_str(self):
         self.model.objects.filter(field='1.2.3.4')
 
@@ -315,13 +407,19 @@ class BaseCidrFieldTestCase(BaseInetTestCase):
     def test_startswith_lookup(self):
         self.assertSqlEquals(
             self.qs.filter(field__startswith='10.'),
+            self.select + 'WHERE ("table"."field" && %s AND TEXT("table"."field") LIKE %s)'
+        )
+
+    def test_startswith_lookup_not_on_boundary(self):
+        self.assertSqlEquals(
+            self.qs.filter(field__startswith='10'),
             self.select + 'WHERE TEXT("table"."field") LIKE %s'
         )
 
     def test_istartswith_lookup(self):
         self.assertSqlEquals(
             self.qs.filter(field__istartswith='10.'),
-            self.select + 'WHERE TEXT("table"."field") LIKE UPPER(%s)'
+            self.select + 'WHERE ("table"."field" && %s AND TEXT("table"."field") LIKE UPPER(%s))'
         )
 
     def test_endswith_lookup(self):
@@ -348,6 +446,12 @@ class BaseCidrFieldTestCase(BaseInetTestCase):
             self.select + 'WHERE TEXT("table"."field") ~* %s'
         )
 
+    def test_anchored_regex_lookup(self):
+        self.assertSqlEquals(
+            self.qs.filter(field__regex=r'^10\.20\.'),
+            self.select + 'WHERE ("table"."field" && %s AND TEXT("table"."field") ~ %s)'
+        )
+
     def test_net_contains_lookup(self):
         self.assertSqlEquals(
             self.qs.filter(field__net_contains='10.0.0.1'),
@@ -427,6 +531,17 @@ class TestInetField(BaseInetFieldTestCase, TestCase):
         instance = self.model.objects.get(field__host='10.1.2.3/27')
         self.assertEqual(str(instance.field), '10.1.2.3/24')
 
+    def test_host_other_rows(self):
+        self.model.objects.create(field='10.1.2.3/24')
+        self.model.objects.create(field='10.1.2.4/8')
+        self.model.objects.create(field='2001:db8::3/64')
+        self.assertEqual(
+            [str(value) for value in self.model.objects.filter(field__host='10.1.2.4/30').values_list('field', flat=True)],
+            ['10.1.2.4/8']
+        )
+        self.assertEqual(self.model.objects.exclude(field__host='10.1.2.4').count(), 2)
+        self.assertEqual(self.model.objects.filter(field__host='2001:db8::3').count(), 1)
+
 
 class TestInetFieldNullable(BaseInetFieldTestCase, TestCase):
     def setUp(self):
@@ -750,6 +865,408 @@ class TestMACAddress8FieldArray(TestCase):
         self.assertIsInstance(instance.field[0], EUI)
 
 
+class TestNetArrayField(TestCase):
+    values = {
+        'inet': [IPv4Interface('10.1.1.1/24'), IPv4Interface('10.1.1.1/24'), None, IPv6Interface('2001:db8::1/64')],
+        'cidr': [IPv4Network('10.1.1.0/24'), IPv4Network('10.1.1.0/24'), None],
+        'mac': [EUI('00:aa:2b:c3:dd:44'), EUI('00:aa:2b:c3:dd:44'), None],
+        'mac8': [EUI('00:aa:2b:c3:dd:44:55:66'), None],
+    }
+
+    def test_save_null(self):
+        NetArrayTestModel().save()
+
+    def test_save_empty(self):
+        instance = NetArrayTestModel.objects.create(inet=[], cidr=[], mac=[], mac8=[])
+        instance = NetArrayTestModel.objects.get(pk=instance.pk)
+        self.assertEqual(instance.inet, [])
+        self.assertEqual(instance.mac8, [])
+
+    def test_roundtrip(self):
+        instance = NetArrayTestModel.objects.create(**self.values)
+        instance = NetArrayTestModel.objects.get(pk=instance.pk)
+        for name, value in self.values.items():
+            self.assertEqual(getattr(instance, name), value)
+        self.assertIsInstance(instance.inet[0], IPv4Interface)
+        self.assertIsInstance(instance.cidr[0], IPv4Network)
+        self.assertIsInstance(instance.mac[0], EUI)
+
+    def test_save_strings(self):
+        instance = NetArrayTestModel.objects.create(inet=['10.1.1.1/24'], mac=['00:AA:2B:C3:DD:44'])
+        instance = NetArrayTestModel.objects.get(pk=instance.pk)
+        self.assertEqual(instance.inet, [IPv4Interface('10.1.1.1/24')])
+        self.assertEqual(str(instance.mac[0]), '00:aa:2b:c3:dd:44')
+
+    def test_repeated_values_are_parsed_once(self):
+        instance = NetArrayTestModel.objects.create(**self.values)
+        instance = NetArrayTestModel.objects.get(pk=instance.pk)
+        self.assertIs(instance.inet[0], instance.inet[1])
+        self.assertIs(instance.cidr[0], instance.cidr[1])
+        self.assertIs(instance.mac[0], instance.mac[1])
+
+    def test_bulk_create_and_update(self):
+        NetArrayTestModel.objects.bulk_create([NetArrayTestModel(**self.values) for i in range(3)])
+        NetArrayTestModel.objects.update(cidr=[IPv4Network('10.2.0.0/16')])
+        instances = list(NetArrayTestModel.objects.all())
+        NetArrayTestModel.objects.bulk_update(instances, ['mac'])
+        self.assertEqual(
+            list(NetArrayTestModel.objects.values_list('cidr', flat=True)),
+            [[IPv4Network('10.2.0.0/16')]] * 3
+        )
+
+    def test_lookups(self):
+        NetArrayTestModel.objects.create(**self.values)
+        self.assertTrue(NetArrayTestModel.objects.filter(cidr__contains=[IPv4Network('10.1.1.0/24')]).exists())
+        self.assertTrue(NetArrayTestModel.objects.filter(mac__0=EUI('00:aa:2b:c3:dd:44')).exists())
+        self.assertTrue(NetArrayTestModel.objects.filter(mac8=self.values['mac8']).exists())
+
+    def test_db_prep_value_is_plain_strings(self):
+        field = NetArrayTestModel._meta.get_field('inet')
+        value = field.get_db_prep_value([IPv4Interface('10.1.1.1/24'), None, [IPv4Interface('10.1.1.2/24')]], connection)
+        self.assertEqual(value, ['10.1.1.1/24', None, ['10.1.1.2/24']])
+        self.assertIs(type(value[0]), str)
+
+
+class TestPrefixRangeLookups(TestCase):
+    def setUp(self):
+        for value in ('10.20.1.1/8', '10.2.0.1/32', '10.200.0.1/16', '110.20.0.1/32', '2001:db8::1/16', '2001:db9::1/64'):
+            InetTestModel.objects.create(field=value)
+        for value in ('10.0.0.0/7', '10.20.0.0/16', '110.20.0.0/16', '2001:db8::/32'):
+            CidrTestModel.objects.create(field=value)
+
+    def assertMatches(self, model, lookup, value, expected):
+        self.assertEqual(
+            sorted(str(field) for field in model.objects.filter(**{lookup: value}).values_list('field', flat=True)),
+            sorted(expected)
+        )
+
+    def test_inet_startswith(self):
+        self.assertMatches(InetTestModel, 'field__startswith', '10.20.', ['10.20.1.1/8'])
+        self.assertMatches(InetTestModel, 'field__startswith', '10.2', ['10.20.1.1/8', '10.2.0.1/32', '10.200.0.1/16'])
+        self.assertMatches(InetTestModel, 'field__startswith', '2001:db8:', ['2001:db8::1/16'])
+        self.assertMatches(InetTestModel, 'field__startswith', '2001:db8::', ['2001:db8::1/16'])
+
+    def test_cidr_startswith(self):
+        self.assertMatches(CidrTestModel, 'field__startswith', '10.', ['10.0.0.0/7', '10.20.0.0/16'])
+        self.assertMatches(CidrTestModel, 'field__startswith', '10.20.', ['10.20.0.0/16'])
+
+    def test_regex(self):
+        self.assertMatches(InetTestModel, 'field__regex', r'^10\.20?\.', ['10.20.1.1/8', '10.2.0.1/32'])
+        self.assertMatches(InetTestModel, 'field__iregex', r'^2001:DB8:', ['2001:db8::1/16'])
+        self.assertMatches(CidrTestModel, 'field__regex', r'^1?10\.20\.', ['10.20.0.0/16', '110.20.0.0/16'])
+
+
+class TestAnyLookups(TestCase):
+    def setUp(self):
+        for value in ('10.0.0.1/32', '10.1.0.1/32', '192.168.1.1/24', '2001:db8::1/128'):
+            InetTestModel.objects.create(field=value)
+        for value in ('10.0.0.0/8', '192.168.0.0/16'):
+            CidrTestModel.objects.create(field=value)
+
+    def test_net_contained_any(self):
+        qs = InetTestModel.objects.filter(
+            field__net_contained_any=[ip_network('10.0.0.0/16'), '2001:db8::/32']
+        )
+        self.assertEqual(
+            sorted(str(value) for value in qs.values_list('field', flat=True)),
+            ['10.0.0.1/32', '2001:db8::1/128']
+        )
+
+    def test_net_contained_any_empty(self):
+        self.assertFalse(InetTestModel.objects.filter(field__net_contained_any=[]).exists())
+
+    def test_net_contains_any(self):
+        qs = CidrTestModel.objects.filter(field__net_contains_any=['10.1.2.3', ip_interface('172.16.0.1/24')])
+        self.assertEqual(list(qs.values_list('field', flat=True)), [ip_network('10.0.0.0/8')])
+
+    def test_net_overlaps_any(self):
+        qs = CidrTestModel.objects.filter(field__net_overlaps_any=['192.168.1.0/24', '0.0.0.0/1'])
+        self.assertEqual(
+            sorted(str(value) for value in qs.values_list('field', flat=True)),
+            ['10.0.0.0/8', '192.168.0.0/16']
+        )
+
+
+class TestLongestPrefixMatch(TestCase):
+    def setUp(self):
+        self.networks = {}
+        for value in ('0.0.0.0/0', '10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24', '2001:db8::/32', '2001:db8:1::/48'):
+            self.networks[value] = CidrTestModel.objects.create(field=value)
+
+    def test_match(self):
+        addresses = ['10.1.2.3', ip_address('10.1.3.1'), '10.2.0.1', '192.168.0.1', '2001:db8:1::1', '2001:db9::1']
+        with self.assertNumQueries(1):
+            matches = CidrTestModel.objects.longest_prefix_match(addresses, field='field')
+        self.assertEqual(
+            dict((address, str(instance.field)) for address, instance in matches.items()),
+            {
+                '10.1.2.3': '10.1.2.0/24',
+                ip_address('10.1.3.1'): '10.1.0.0/16',
+                '10.2.0.1': '10.0.0.0/8',
+                '192.168.0.1': '0.0.0.0/0',
+                '2001:db8:1::1': '2001:db8:1::/48',
+            }
+        )
+        self.assertEqual(matches['10.1.2.3'].pk, self.networks['10.1.2.0/24'].pk)
+        self.assertIsInstance(matches['10.1.2.3'].field, IPv4Network)
+        self.assertFalse(hasattr(matches['10.1.2.3'], 'lpm_ordinality'))
+
+    def test_filtered_queryset(self):
+        matches = CidrTestModel.objects.exclude(field='10.1.2.0/24').longest_prefix_match(['10.1.2.3'], field='field')
+        self.assertEqual(matches['10.1.2.3'].field, ip_network('10.1.0.0/16'))
+
+    def test_no_addresses(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(CidrTestModel.objects.longest_prefix_match([], field='field'), {})
+
+    def test_empty_queryset(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(CidrTestModel.objects.none().longest_prefix_match(['10.1.2.3'], field='field'), {})
+            self.assertEqual(
+                CidrTestModel.objects.filter(pk__in=[]).longest_prefix_match(['10.1.2.3'], field='field'), {})
+
+    def test_inet_field(self):
+        InetTestModel.objects.create(field='10.1.2.3/16')
+        InetTestModel.objects.create(field='10.1.2.3/24')
+        matches = InetTestModel.objects.longest_prefix_match(['10.1.2.200', '10.1.3.1'], field='field')
+        self.assertEqual(matches['10.1.2.200'].field, ip_interface('10.1.2.3/24'))
+        self.assertEqual(matches['10.1.3.1'].field, ip_interface('10.1.2.3/16'))
+
+
+class UniterableNetwork(IPv4Network):
+    def __iter__(self):
+        raise AssertionError('%s was iterated' % self)
+
+
+class TestNetworkValues(TestCase):
+    def setUp(self):
+        self.network = UniterableNetwork('10.0.0.0/8')
+        self.row = CidrTestModel.objects.create(field='10.0.0.0/8')
+        CidrTestModel.objects.create(field='10.1.0.0/16')
+        CidrTestModel.objects.create(field='192.168.0.0/16')
+
+    def assertRows(self, qs, values):
+        self.assertEqual(sorted(str(value) for value in qs.values_list('field', flat=True)), values)
+
+    def test_filter(self):
+        self.assertRows(CidrTestModel.objects.all().filter(field=self.network), ['10.0.0.0/8'])
+        self.assertRows(CidrTestModel.objects.filter(field__net_contained=self.network), ['10.1.0.0/16'])
+
+    def test_exclude(self):
+        self.assertRows(CidrTestModel.objects.all().exclude(field=self.network), ['10.1.0.0/16', '192.168.0.0/16'])
+
+    def test_get(self):
+        self.assertEqual(CidrTestModel.objects.all().get(field=self.network).pk, self.row.pk)
+        self.assertEqual(CidrTestModel.objects.get_or_create(field=self.network)[0].pk, self.row.pk)
+
+    def test_q(self):
+        qs = CidrTestModel.objects.filter(Q(field=self.network) | ~Q(field__net_contained_or_equal=self.network))
+        self.assertRows(qs, ['10.0.0.0/8', '192.168.0.0/16'])
+        self.assertRows(CidrTestModel.objects.complex_filter(Q(field=self.network)), ['10.0.0.0/8'])
+        self.assertRows(CidrTestModel.objects.complex_filter({'field': self.network}), ['10.0.0.0/8'])
+
+    def test_in(self):
+        self.assertRows(CidrTestModel.objects.filter(field__in=self.network), ['10.0.0.0/8'])
+        self.assertRows(CidrTestModel.objects.filter(field__in=[self.network, '10.1.0.0/16']), ['10.0.0.0/8', '10.1.0.0/16'])
+        self.assertRows(CidrTestModel.objects.filter(field__net_contained_any=self.network), ['10.1.0.0/16'])
+
+    def test_lookups_without_net_manager(self):
+        AggregateTestModel.objects.create(network='10.0.0.0/8')
+        self.assertEqual(AggregateTestModel.objects.filter(network__in=self.network).count(), 1)
+        self.assertEqual(AggregateTestModel.objects.filter(network__net_contained_or_equal_any=self.network).count(), 1)
+
+    def test_update(self):
+        CidrTestModel.objects.filter(pk=self.row.pk).update(field=UniterableNetwork('10.2.0.0/16'))
+        self.assertEqual(CidrTestModel.objects.get(pk=self.row.pk).field, ip_network('10.2.0.0/16'))
+
+
+class TestUtilisation(TestCase):
+    def test_subnets(self):
+        for value in ('10.0.0.0/16', '10.0.0.0/24', '10.0.0.0/25', '10.0.1.0/24', '192.168.0.0/24', '2001:db8::/32',
+                      '2001:db8::/33'):
+            CidrTestModel.objects.create(field=value)
+        with self.assertNumQueries(1):
+            rows = [
+                (str(row.field), row.child_count, row.used_addresses, row.utilisation)
+                for row in CidrTestModel.objects.annotate_utilisation(CidrTestModel.objects.all(), 'field', field='field')
+            ]
+        self.assertEqual(rows, [
+            ('10.0.0.0/16', 3, 512, 512 * 100 / 65536),
+            ('10.0.0.0/24', 1, 128, 50.0),
+            ('10.0.0.0/25', 0, 0, 0.0),
+            ('10.0.1.0/24', 0, 0, 0.0),
+            ('192.168.0.0/24', 0, 0, 0.0),
+            ('2001:db8::/32', 1, 2 ** 95, 50.0),
+            ('2001:db8::/33', 0, 0, 0.0),
+        ])
+
+    def test_equal_networks(self):
+        first = CidrTestModel.objects.create(field='10.0.0.0/24')
+        CidrTestModel.objects.create(field='10.0.0.0/24')
+        rows = CidrTestModel.objects.annotate_utilisation(CidrTestModel.objects.all(), 'field', field='field')
+        self.assertEqual([(row.pk == first.pk, row.child_count, row.utilisation) for row in rows], [
+            (True, 1, 100.0),
+            (False, 1, 100.0),
+        ])
+        row, = CidrTestModel.objects.filter(pk=first.pk).annotate_utilisation(
+            AggregateTestModel.objects.all(), 'network', field='field')
+        self.assertEqual(row.child_count, 0)
+        AggregateTestModel.objects.create(network='10.0.0.0/24')
+        row, = CidrTestModel.objects.filter(pk=first.pk).annotate_utilisation(
+            AggregateTestModel.objects.all(), 'network', field='field')
+        self.assertEqual((row.child_count, row.utilisation), (1, 100.0))
+
+    def test_empty_children(self):
+        parent = CidrTestModel.objects.create(field='10.0.0.0/24')
+        CidrTestModel.objects.create(field='10.0.0.0/25')
+        InetTestModel.objects.create(field='10.0.0.1/24')
+        for children, child_field in (
+            (CidrTestModel.objects.none(), 'field'),
+            (CidrTestModel.objects.filter(pk__in=[]), 'field'),
+            (InetTestModel.objects.none(), 'field'),
+        ):
+            row = CidrTestModel.objects.filter(pk=parent.pk).annotate_utilisation(children, child_field, field='field')[0]
+            self.assertEqual((row.pk, row.child_count, row.used_addresses, row.utilisation), (parent.pk, 0, 0, 0.0))
+
+    def test_empty_parents(self):
+        CidrTestModel.objects.create(field='10.0.0.0/24')
+        children = CidrTestModel.objects.all()
+        self.assertEqual(list(CidrTestModel.objects.none().annotate_utilisation(children, 'field', field='field')), [])
+        self.assertEqual(
+            list(CidrTestModel.objects.filter(pk__in=[]).annotate_utilisation(children, 'field', field='field')), [])
+
+    def test_hosts(self):
+        parent = CidrTestModel.objects.create(field='10.0.0.0/30')
+        CidrTestModel.objects.create(field='10.0.1.0/24')
+        for value in ('10.0.0.1/24', '10.0.0.1/30', '10.0.0.2/8', '10.0.1.2/8', '2001:db8::1/64'):
+            InetTestModel.objects.create(field=value)
+        qs = CidrTestModel.objects.filter(pk=parent.pk)
+        row, = qs.annotate_utilisation(InetTestModel.objects.all(), 'field', field='field')
+        self.assertEqual(row.pk, parent.pk)
+        self.assertEqual((row.child_count, row.used_addresses, row.utilisation), (3, 2, 50.0))
+
+    def test_filtered_children(self):
+        CidrTestModel.objects.create(field='10.0.0.0/24')
+        CidrTestModel.objects.create(field='10.0.0.0/26')
+        CidrTestModel.objects.create(field='10.0.0.64/26')
+        children = CidrTestModel.objects.exclude(field='10.0.0.64/26')
+        row = CidrTestModel.objects.filter(field='10.0.0.0/24').annotate_utilisation(children, 'field', field='field')[0]
+        self.assertEqual((row.child_count, row.used_addresses, row.utilisation), (1, 64, 25.0))
+
+
+class TestFreeSpace(TestCase):
+    def test_free_subnets(self):
+        for value in ('10.0.0.0/24', '10.0.1.0/25', '10.0.2.128/25', '10.0.8.0/21', '192.168.0.0/16'):
+            CidrTestModel.objects.create(field=value)
+        subnets = CidrTestModel.objects.free_subnets('10.0.0.0/8', 24, limit=5, field='field')
+        with self.assertNumQueries(1):
+            subnets = list(subnets)
+        self.assertEqual(
+            [str(subnet) for subnet in subnets],
+            ['10.0.3.0/24', '10.0.4.0/24', '10.0.5.0/24', '10.0.6.0/24', '10.0.7.0/24']
+        )
+        self.assertEqual(
+            list(CidrTestModel.objects.free_subnets(ip_network('10.0.0.0/22'), 25, field='field')),
+            [ip_network('10.0.1.128/25'), ip_network('10.0.2.0/25'), ip_network('10.0.3.0/25'),
+             ip_network('10.0.3.128/25')]
+        )
+
+    def test_free_subnets_lazy(self):
+        with self.assertNumQueries(0):
+            subnets = CidrTestModel.objects.free_subnets('0.0.0.0/0', 32, field='field')
+        with self.assertNumQueries(1):
+            self.assertEqual(next(subnets), ip_network('0.0.0.0/32'))
+            self.assertEqual(next(subnets), ip_network('0.0.0.1/32'))
+        subnets.close()
+
+    def test_free_subnets_empty_queryset(self):
+        CidrTestModel.objects.create(field='10.0.0.0/25')
+        self.assertEqual(
+            list(CidrTestModel.objects.none().free_subnets('10.0.0.0/24', 25, field='field')),
+            [ip_network('10.0.0.0/25'), ip_network('10.0.0.128/25')]
+        )
+        self.assertEqual(
+            list(InetTestModel.objects.filter(pk__in=[]).free_subnets('10.0.0.0/24', 25, field='field')),
+            [ip_network('10.0.0.0/25'), ip_network('10.0.0.128/25')]
+        )
+
+    def test_free_subnets_covering_row(self):
+        CidrTestModel.objects.create(field='10.0.0.0/8')
+        self.assertEqual(list(CidrTestModel.objects.free_subnets('10.1.0.0/16', 24, field='field')), [])
+
+    def test_free_subnets_filtered_queryset(self):
+        CidrTestModel.objects.create(field='10.0.0.0/25')
+        CidrTestModel.objects.create(field='10.0.0.128/25')
+        qs = CidrTestModel.objects.exclude(field='10.0.0.128/25')
+        self.assertEqual(list(qs.free_subnets('10.0.0.0/24', 25, field='field')), [ip_network('10.0.0.128/25')])
+
+    def test_free_subnets_address_space_ends(self):
+        CidrTestModel.objects.create(field='0.0.0.0/32')
+        CidrTestModel.objects.create(field='255.255.255.255/32')
+        self.assertEqual(
+            list(CidrTestModel.objects.free_subnets('0.0.0.0/0', 1, field='field')),
+            []
+        )
+        self.assertEqual(
+            list(CidrTestModel.objects.free_subnets('0.0.0.0/0', 2, field='field')),
+            [ip_network('64.0.0.0/2'), ip_network('128.0.0.0/2')]
+        )
+
+    def test_free_subnets_ipv6(self):
+        CidrTestModel.objects.create(field='2001:db8::/64')
+        CidrTestModel.objects.create(field='10.0.0.0/8')
+        self.assertEqual(
+            list(CidrTestModel.objects.free_subnets('2001:db8::/32', 64, limit=2, field='field')),
+            [ip_network('2001:db8:0:1::/64'), ip_network('2001:db8:0:2::/64')]
+        )
+
+    def test_free_subnets_inet_field(self):
+        InetTestModel.objects.create(field='10.0.0.1/8')
+        InetTestModel.objects.create(field='10.0.1.200/24')
+        self.assertEqual(
+            list(InetTestModel.objects.free_subnets('10.0.0.0/22', 24, field='field')),
+            [ip_network('10.0.2.0/24'), ip_network('10.0.3.0/24')]
+        )
+
+    def test_free_subnets_prefixlen(self):
+        with self.assertRaises(ValueError):
+            CidrTestModel.objects.free_subnets('10.0.0.0/24', 23, field='field')
+        with self.assertRaises(ValueError):
+            CidrTestModel.objects.free_subnets('10.0.0.0/24', 33, field='field')
+
+    def test_first_free_address(self):
+        for value in ('10.0.0.1/24', '10.0.0.2/24', '10.0.0.4/24'):
+            InetTestModel.objects.create(field=value)
+        with self.assertNumQueries(1):
+            self.assertEqual(InetTestModel.objects.first_free_address('10.0.0.0/24', field='field'), ip_address('10.0.0.3'))
+        self.assertEqual(InetTestModel.objects.first_free_address('10.0.1.0/24', field='field'), ip_address('10.0.1.1'))
+        self.assertEqual(
+            InetTestModel.objects.first_free_address('2001:db8::/64', field='field'),
+            ip_address('2001:db8::1')
+        )
+
+    def test_first_free_address_cidr_field(self):
+        CidrTestModel.objects.create(field='10.0.0.0/25')
+        self.assertEqual(CidrTestModel.objects.first_free_address('10.0.0.0/24', field='field'), ip_address('10.0.0.128'))
+
+    def test_first_free_address_empty_queryset(self):
+        InetTestModel.objects.create(field='10.0.0.1/24')
+        self.assertEqual(
+            InetTestModel.objects.filter(pk__in=[]).first_free_address('10.0.0.0/24', field='field'),
+            ip_address('10.0.0.1')
+        )
+        self.assertEqual(
+            CidrTestModel.objects.none().first_free_address('10.0.0.0/24', field='field'),
+            ip_address('10.0.0.1')
+        )
+
+    def test_first_free_address_full(self):
+        InetTestModel.objects.create(field='10.0.0.1/30')
+        InetTestModel.objects.create(field='10.0.0.2/30')
+        self.assertIsNone(InetTestModel.objects.first_free_address('10.0.0.0/30', field='field'))
+        self.assertEqual(InetTestModel.objects.first_free_address('10.0.0.0/31', field='field'), ip_address('10.0.0.0'))
+
+
 class TestAggregate(TestCase):
     def test_aggregate_inet(self):
         from django.contrib.postgres.aggregates import ArrayAgg
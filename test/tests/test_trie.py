@@ -0,0 +1,146 @@
+from ipaddress import IPv4Network, IPv6Network, ip_address, ip_interface, ip_network
+
+from django.test import TestCase
+
+from netfields.compact import compact_network
+from netfields.trie import PrefixTree
+from test.models import CidrTestModel, InetTestModel
+
+
+class TestPrefixTree(TestCase):
+    def setUp(self):
+        self.tree = PrefixTree([
+            ('0.0.0.0/0', 'default'),
+            (ip_network('10.0.0.0/8'), 'a'),
+            ('10.1.0.0/16', 'b'),
+            (ip_interface('10.1.2.3/24'), 'c'),
+            ('2001:db8::/32', 'v6'),
+            ('2001:db8:1::/48', 'v6-1'),
+        ])
+
+    def test_len(self):
+        self.assertEqual(len(self.tree), 6)
+        self.assertEqual(len(PrefixTree()), 0)
+
+    def test_getitem(self):
+        self.assertEqual(self.tree['10.1.2.0/24'], 'c')
+        self.assertEqual(self.tree[IPv4Network('0.0.0.0/0')], 'default')
+        self.assertEqual(self.tree[compact_network('2001:db8::/32')], 'v6')
+        with self.assertRaises(KeyError):
+            self.tree['10.1.0.0/17']
+        with self.assertRaises(KeyError):
+            self.tree['::/0']
+        with self.assertRaises(KeyError):
+            self.tree['192.168.0.0/16']
+
+    def test_contains(self):
+        self.assertIn('10.0.0.0/8', self.tree)
+        self.assertNotIn('10.0.0.0/9', self.tree)
+
+    def test_setitem_replaces(self):
+        self.tree['10.0.0.0/8'] = 'replaced'
+        self.assertEqual(self.tree['10.0.0.0/8'], 'replaced')
+        self.assertEqual(len(self.tree), 6)
+
+    def test_delitem(self):
+        del self.tree['10.1.0.0/16']
+        self.assertNotIn('10.1.0.0/16', self.tree)
+        self.assertEqual(self.tree.longest_prefix_match('10.1.3.1'), (IPv4Network('10.0.0.0/8'), 'a'))
+        with self.assertRaises(KeyError):
+            del self.tree['10.1.0.0/16']
+
+    def test_delitem_prunes_nodes(self):
+        trie = self.tree._tries[4]
+        size = len(trie.zero)
+        for _ in range(3):
+            self.tree['192.168.1.1/32'] = 'host'
+            del self.tree['192.168.1.1/32']
+        self.assertEqual(len(trie.zero), size + 32)
+        self.assertEqual(len(trie.free), 32)
+        del self.tree['10.1.2.0/24']
+        self.assertEqual(len(trie.free), 32 + 8)
+        self.assertEqual(self.tree.longest_prefix_match('10.1.2.3'), (IPv4Network('10.1.0.0/16'), 'b'))
+        self.assertEqual([value for network, value in self.tree.covered('10.0.0.0/8')], ['a', 'b'])
+        self.tree['10.1.2.0/24'] = 'c'
+        self.assertEqual(len(trie.free), 32)
+        self.assertEqual(self.tree['10.1.2.0/24'], 'c')
+
+    def test_longest_prefix_match(self):
+        self.assertEqual(self.tree.longest_prefix_match('10.1.2.200'), (IPv4Network('10.1.2.0/24'), 'c'))
+        self.assertEqual(self.tree.longest_prefix_match(ip_address('10.1.3.1')), (IPv4Network('10.1.0.0/16'), 'b'))
+        self.assertEqual(self.tree.longest_prefix_match('11.0.0.1'), (IPv4Network('0.0.0.0/0'), 'default'))
+        self.assertEqual(
+            self.tree.longest_prefix_match('2001:db8:1::1/64'),
+            (IPv6Network('2001:db8:1::/48'), 'v6-1')
+        )
+        self.assertIsNone(self.tree.longest_prefix_match('2001:db9::1'))
+        self.assertEqual(self.tree.longest_prefix_match('2001:db9::1', 'none'), 'none')
+
+    def test_host_prefixes(self):
+        tree = PrefixTree([('10.0.0.1/32', 'host'), ('::1/128', 'loopback')])
+        self.assertEqual(tree.longest_prefix_match('10.0.0.1'), (IPv4Network('10.0.0.1/32'), 'host'))
+        self.assertIsNone(tree.longest_prefix_match('10.0.0.2'))
+        self.assertEqual(tree.longest_prefix_match('::1'), (IPv6Network('::1/128'), 'loopback'))
+
+    def test_covering(self):
+        self.assertEqual(
+            [value for network, value in self.tree.covering('10.1.2.0/25')],
+            ['default', 'a', 'b', 'c']
+        )
+        self.assertEqual(list(self.tree.covering('10.1.0.0/16'))[-1], (IPv4Network('10.1.0.0/16'), 'b'))
+        self.assertEqual(list(self.tree.covering('2001:db9::/32')), [])
+
+    def test_covered(self):
+        self.assertEqual(
+            list(self.tree.covered('10.0.0.0/8')),
+            [
+                (IPv4Network('10.0.0.0/8'), 'a'),
+                (IPv4Network('10.1.0.0/16'), 'b'),
+                (IPv4Network('10.1.2.0/24'), 'c'),
+            ]
+        )
+        self.assertEqual([value for network, value in self.tree.covered('2001:db8::/31')], ['v6', 'v6-1'])
+        self.assertEqual(list(self.tree.covered('192.168.0.0/16')), [])
+
+    def test_covered_host_prefixes(self):
+        tree = PrefixTree([
+            ('10.0.0.1/32', 'host'), ('10.0.0.0/24', 'subnet'), ('2001:db8::1/128', 'v6-host'), ('::/0', 'v6'),
+        ])
+        self.assertEqual(
+            list(tree.covered('10.0.0.0/24')),
+            [(IPv4Network('10.0.0.0/24'), 'subnet'), (IPv4Network('10.0.0.1/32'), 'host')]
+        )
+        self.assertEqual(list(tree.covered('10.0.0.1/32')), [(IPv4Network('10.0.0.1/32'), 'host')])
+        self.assertEqual(list(tree.covered('2001:db8::1/128')), [(IPv6Network('2001:db8::1/128'), 'v6-host')])
+        self.assertEqual([value for network, value in tree.items()], ['subnet', 'host', 'v6', 'v6-host'])
+
+    def test_items(self):
+        self.assertEqual(
+            [value for network, value in self.tree.items()],
+            ['default', 'a', 'b', 'c', 'v6', 'v6-1']
+        )
+        self.tree['10.1.2.3/32'] = 'host'
+        self.tree['2001:db8:1::1/128'] = 'v6-host'
+        self.assertEqual(
+            [value for network, value in self.tree.items()],
+            ['default', 'a', 'b', 'c', 'host', 'v6', 'v6-1', 'v6-host']
+        )
+
+
+class TestPrefixTreeFromQueryset(TestCase):
+    def test_values(self):
+        for network in ('10.0.0.0/8', '10.1.0.0/16', '2001:db8::/32'):
+            CidrTestModel.objects.create(field=network)
+        tree = PrefixTree.from_queryset(CidrTestModel.objects.all(), 'field', value='pk')
+        network, pk = tree.longest_prefix_match('10.1.2.3')
+        self.assertEqual(network, IPv4Network('10.1.0.0/16'))
+        self.assertEqual(pk, CidrTestModel.objects.get(field='10.1.0.0/16').pk)
+
+    def test_instances(self):
+        InetTestModel.objects.create(field='10.1.2.3/24')
+        InetTestModel.objects.create(field='2001:db8::1/64')
+        tree = PrefixTree.from_queryset(InetTestModel.objects.all(), 'field')
+        network, instance = tree.longest_prefix_match('10.1.2.200')
+        self.assertEqual(network, IPv4Network('10.1.2.0/24'))
+        self.assertEqual(instance.field, ip_interface('10.1.2.3/24'))
+        self.assertIsNone(tree.longest_prefix_match('10.1.3.1'))